@@ -0,0 +1,64 @@
+from timeit import timeit
+
+from pyndfd import ndfd
+
+
+# the original unpacker, which peels 7 bits at a time off one big integer
+def unpackStringLoop(raw):
+    num_bytes, remainder = divmod(len(raw) * 8 - 1, 7)
+
+    i = int(raw.encode('hex'), 16)
+    if remainder:
+        i >>= remainder
+
+    msg = []
+    for _ in range(num_bytes):
+        byte = i & 127
+        if not byte:
+            msg.append(ord("\n"))
+        elif 32 <= byte <= 126:
+            msg.append(byte)
+        i >>= 7
+    msg.reverse()
+    msg = b"".join(chr(c) for c in msg)
+
+    codes = []
+    for line in msg.splitlines():
+        if len(line) >= 4 and (line.count(':') >= 4 or line.count('.') >= 1 or '<None>' in line):
+            codes.append(line)
+
+    return codes
+
+
+
+# It's important to set the cache server to our own, or vars will be retrieved from NWS (slow)
+ndfd.setLocalCacheServer('http://ndfd.eas.cornell.edu/')
+
+area = 'conus'
+repeat = 20
+
+
+
+for var in ['wx', 'wwa']:
+    sections = []
+    for g in ndfd.getVariable(var, area):
+        for grb in ndfd.getDecodedMessages(g):
+            raw = ndfd.readLocalUseSection(g, grb.messagenumber, grb.meta['keys'].get('offset'))
+            if raw != None:
+                sections.append(raw)
+
+    for raw in sections:
+        if unpackStringLoop(raw) != ndfd.unpackString(raw):
+            raise RuntimeError('unpackString does not match the original unpacker')
+
+    loop = timeit(lambda: [unpackStringLoop(raw) for raw in sections], number=repeat) / repeat
+    vectorized = timeit(lambda: [ndfd.unpackString(raw) for raw in sections], number=repeat) / repeat
+
+    print '\n**********'
+    print 'Var: ' + var
+    print 'Sections: ' + str(len(sections))
+    print 'Bytes: ' + str(sum(len(raw) for raw in sections))
+    print 'Loop: {0:.2f}ms'.format(loop * 1000)
+    print 'Vectorized: {0:.2f}ms'.format(vectorized * 1000)
+    print 'Speedup: {0:.1f}x'.format(loop / vectorized)
+    print '**********'
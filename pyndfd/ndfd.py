@@ -34,20 +34,33 @@
 #         #
 ###########
 
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from getpass import getuser
-from math import isnan, sqrt
-from ncepgrib2 import Grib2Decode as ncepgrib
+from httplib import HTTPConnection, HTTPException, HTTPSConnection
+from math import isnan
+from multiprocessing.pool import ThreadPool
 from ndfd_defs import ndfdDefs
-from numpy.ma.core import MaskedConstant as NAN
-from os import makedirs, path
+from os import close, fdopen, link, listdir, makedirs, path, remove, rename, stat
 from pyproj import Geod, Proj
-from shutil import rmtree
+from shutil import copyfile, rmtree
 from sys import stderr
-from tempfile import gettempdir
+from tempfile import gettempdir, mkstemp
+from threading import Event, Lock, Thread, current_thread, local
 from urllib import urlretrieve
+from urlparse import urljoin, urlparse, urlunparse
+import hashlib
 import json
+import re
+import numpy as np
 import pygrib
+import socket
+import struct
+import warnings
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 #############
 #           #
@@ -57,15 +70,107 @@ import pygrib
 
 DEFS = ndfdDefs()
 G = Geod(ellps='clrk66')
+GRID_GEOMETRY = { }
+AREA_FALLBACKS = ['conus', 'nhemi', 'npacocn']
+
+'''
+
+  Function:	_nansum
+  Purpose:	Sum values along an axis ignoring NaN, like np.nansum, but with NaN
+		instead of 0 where there are no valid values to sum
+  Params:
+	vals:	Array of values
+	axis:	The axis to sum along, or None for all values. Default = None
+
+'''
+def _nansum(vals, axis=None):
+    sums = np.nansum(vals, axis=axis)
+    return np.where(np.isnan(vals).all(axis=axis), np.nan, sums)[()]
+
+STATISTICS = {
+  'min': np.nanmin,
+  'max': np.nanmax,
+  'mean': np.nanmean,
+  'median': np.nanmedian,
+  'stdDev': np.nanstd,
+  'sum': _nansum
+}
+
+CODE_TABLES_SIZE = 1024
+PARSED_STRINGS_SIZE = 4096
+POINT_RESULTS_SIZE = 32 * 1024 * 1024
+POINT_RESULTS_CYCLE = None
+SCAN_RESULTS_SIZE = 64 * 1024 * 1024
+POLYGON_MASKS_SIZE = 64 * 1024 * 1024
+SCAN_OPERATORS = {
+  '>': np.greater,
+  '>=': np.greater_equal,
+  '<': np.less,
+  '<=': np.less_equal,
+  '==': np.equal,
+  '!=': np.not_equal
+}
 
 CACHE_SERVER_BUFFER_MIN = 20
+READY_FORECAST_TIME = None
+PREFETCH_DAEMON = None
+PREFETCH_INTERVAL_SEC = 60
+PREFETCH_LOCK = Lock()
+CACHE_KEEP_CYCLES = 2
+STATIC_REVALIDATED = { }
+STATIC_RETRY_SEC = 300
+SHARED_MEMORY_DIR = None
+TERRAIN = { }
+TERRAIN_MMAP = True
+
+DOWNLOAD_THREADS = 8
+DOWNLOAD_TIMEOUT = 60
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_MAX_REDIRECTS = 5
+DOWNLOAD_POOL = None
+DOWNLOAD_POOL_LOCK = Lock()
+HTTP_CONNECTIONS = local()
+INDEX_CHUNK_SIZE = 4096
+DECODE_THREADS = 4
+DECODE_POOL = None
+DECODE_POOL_LOCK = Lock()
+
+# hours per GRIB2 code table 4.4 forecast time unit
+FORECAST_TIME_UNITS = { 0: 1 / 60.0, 1: 1, 2: 24, 10: 3, 11: 6, 12: 12, 13: 1 / 3600.0 }
 
 NDFD_LOCAL_SERVER = None
 NDFD_REMOTE_SERVER = 'http://tgftp.nws.noaa.gov/SL.us008001/ST.opnl/DF.gr2/'
 NDFD_DIR = 'DC.ndfd' + path.sep + 'AR.{0}' + path.sep + 'VP.{1}' + path.sep
 NDFD_STATIC = 'static' + path.sep + 'DC.ndfd' + path.sep + 'AR.{0}' + path.sep
 NDFD_VAR = 'ds.{0}.bin'
+NDFD_STATIC_GRIDS = 'static' + path.sep + 'grids.json'
 NDFD_TMP = gettempdir() + path.sep + str(getuser()) + '_pyndfd' + path.sep
+NDFD_OBJECTS = 'objects' + path.sep
+NDFD_VALIDATORS = 'validators' + path.sep
+NDFD_MESSAGE_INDEX = '.idx.json'
+NDFD_MESSAGES = '{0}.msgs' + path.sep
+NDFD_DECODED = '{0}.npy' + path.sep
+NDFD_DECODED_INDEX = 'index.json'
+NDFD_INTEGRAL = '{0:04d}.sat.npy'
+NDFD_INTEGRAL_OFFSET = '{0:04d}.sat.json'
+NDFD_CUBE = 'cube' + path.sep + 'AR.{0}' + path.sep + 'ds.{1}' + path.sep
+NDFD_CUBE_DATA = 'cube.npy'
+NDFD_CUBE_INDEX = 'index.json'
+NDFD_CUBE_INTEGRAL = 'sat' + path.sep
+NDFD_MASKS = 'masks' + path.sep
+NDFD_MASK = '{0}.{1}.npz'
+NDFD_LOCK = '{0}.lock'
+NDFD_DECODE_LOCK = '{0}.decode.lock'
+NDFD_CACHE_LOCK = '.cache.lock'
+
+DECODED_DTYPE = np.float32
+DECODED_KEYS = [
+  'year', 'month', 'day', 'hour', 'forecastTime',
+  'parameterUnits', 'missingValue',
+  'longitudeOfFirstGridPointInDegrees', 'latitudeOfFirstGridPointInDegrees',
+  'DxInMetres', 'DyInMetres', 'DiInMetres', 'DjInMetres',
+  'Nx', 'Ny', 'Ni', 'Nj', 'offset'
+]
 
 ########################
 #                      #
@@ -85,93 +190,1073 @@ def setLocalCacheServer(uri):
     global NDFD_LOCAL_SERVER 
     NDFD_LOCAL_SERVER = uri
 
+'''
+
+  Function:	setSharedMemoryDir
+  Purpose:	Keep decoded grids and cubes in a shared memory file system instead
+		of next to the cached grib files. Every process using the same
+		directory memory-maps the same decoded grids, so a cycle decoded by
+		one process (e.g. the prefetch daemon) is attached zero-copy by the
+		others. Decoded cycles are removed along with their grib files.
+  Params:
+	dir:	The shared memory directory, or None to turn the mode off.
+		Default = /dev/shm
+
+'''
+def setSharedMemoryDir(dir='/dev/shm'):
+    global SHARED_MEMORY_DIR
+    if dir == None:
+        SHARED_MEMORY_DIR = None
+        return
+    if not path.isdir(dir):
+        raise ValueError('Invalid shared memory directory: ' + str(dir))
+    SHARED_MEMORY_DIR = path.join(dir, str(getuser()) + '_pyndfd') + path.sep
+
+'''
+
+  Function:	_sharedPath
+  Purpose:	Return where a decoded path under NDFD_TMP is kept, which is the same
+		relative path under SHARED_MEMORY_DIR when shared memory is turned on
+  Params:
+	cachePath:	The path under NDFD_TMP
+
+'''
+def _sharedPath(cachePath):
+    if SHARED_MEMORY_DIR == None or not cachePath.startswith(NDFD_TMP):
+        return cachePath
+    return SHARED_MEMORY_DIR + cachePath[len(NDFD_TMP):]
+
+'''
+
+  Class:	LRUCache
+  Purpose:	A thread safe least recently used cache. Entries are evicted oldest
+		first once the total size of the entries goes over maxSize.
+  Params:
+	maxSize:	The maximum total size of the entries
+	sizeOf:		Optional function returning the size of a value. Default is
+			for every value to have a size of 1, bounding the entry count.
+
+'''
+class LRUCache(object):
+    def __init__(self, maxSize, sizeOf=None):
+        self.maxSize = maxSize
+        self.sizeOf = sizeOf
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+    def get(self, key, default=None):
+        with self.lock:
+            if not key in self.entries:
+                return default
+            entry = self.entries.pop(key)
+            self.entries[key] = entry
+            return entry[0]
+
+    def put(self, key, value):
+        size = 1 if self.sizeOf == None else self.sizeOf(value)
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size)
+            self.size += size
+            while self.size > self.maxSize and len(self.entries) > 0:
+                self.size -= self.entries.popitem(last=False)[1][1]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+'''
+
+  Function:	_pointResultSize
+  Purpose:	Estimate the memory used by a cached point result in bytes, to bound
+		the POINT_RESULTS LRU cache by memory
+  Params:
+	result:	The cached result, see getForecastAnalysis
+
+'''
+def _pointResultSize(result):
+    return 1024 + sum(256 + 64 * len(forecast) for forecast in result['forecasts'].values())
+
+CODE_TABLES = LRUCache(CODE_TABLES_SIZE)
+POINT_RESULTS = LRUCache(POINT_RESULTS_SIZE, _pointResultSize)
+SCAN_RESULTS = LRUCache(SCAN_RESULTS_SIZE, lambda cells: cells.nbytes + 64)
+POLYGON_MASKS = LRUCache(POLYGON_MASKS_SIZE, lambda masks: masks[0].nbytes + masks[1].nbytes)
+PARSED_WEATHER_STRINGS = LRUCache(PARSED_STRINGS_SIZE)
+PARSED_ADVISORY_STRINGS = LRUCache(PARSED_STRINGS_SIZE)
+
+'''
+
+  Class:	FileLock
+  Purpose:	An advisory lock on a file shared by every process using the cache,
+		held with the with statement. Separate FileLock objects also exclude
+		each other within a process. Does nothing where fcntl is unavailable.
+  Params:
+	lockPath:	The path of the lock file, created if it does not exist
+	shared:		Take a shared lock instead of an exclusive one. Default = False
+	blocking:	Wait for the lock instead of failing to take it. Default = True.
+			The with statement gives whether the lock was taken.
+
+'''
+class FileLock(object):
+    def __init__(self, lockPath, shared=False, blocking=True):
+        self.lockPath = lockPath
+        self.shared = shared
+        self.blocking = blocking
+        self.f = None
+
+    def acquire(self):
+        if fcntl == None:
+            return True
+        lockDir = path.dirname(self.lockPath)
+        if not path.isdir(lockDir):
+            try: makedirs(lockDir)
+            except OSError: pass
+        self.f = open(self.lockPath, 'a')
+        flags = fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX
+        if not self.blocking:
+            flags |= fcntl.LOCK_NB
+        try:
+            fcntl.flock(self.f.fileno(), flags)
+        except IOError:
+            self.f.close()
+            self.f = None
+            return False
+        return True
+
+    def release(self):
+        if self.f != None:
+            fcntl.flock(self.f.fileno(), fcntl.LOCK_UN)
+            self.f.close()
+            self.f = None
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, type, value, traceback):
+        self.release()
+
+'''
+
+  Function:	_cacheLock
+  Purpose:	Return a lock on the whole cache. Work that writes into the cache holds
+		it shared, and cleanCache holds it exclusively while removing files.
+  Params:
+	shared:		Take a shared lock. Default = True
+	blocking:	Wait for the lock. Default = True
+
+'''
+def _cacheLock(shared=True, blocking=True):
+    return FileLock(NDFD_TMP + NDFD_CACHE_LOCK, shared, blocking)
+
 '''
 
   Function:	stdDev
-  Purpose:	Calculate the standard deviation of a list of float values
+  Purpose:	Calculate the standard deviation of a list of float values,
+		ignoring missing (NaN or masked) values
   Params:
 	vals:	List of float values to use in calculation
 
 '''
 def stdDev(vals):
-    mean = sum(vals) / len(vals)
-    squared = []
-    for val in vals:
-        squared.append(pow(val - mean, 2) * 1.0)
-    variance = sum(squared) / len(squared)
-    return sqrt(variance)
+    return float(computeStatistics(vals, ['stdDev'])['stdDev'])
 
 '''
 
   Function:	median
-  Purpose:	Calculate the median of a list of int/float values
+  Purpose:	Calculate the median of a list of int/float values,
+		ignoring missing (NaN or masked) values
   Params:
 	vals:	List of int/float values to use in calculation
 
 '''
 def median(vals):
-    sortedLst = sorted(vals)
-    lstLen = len(vals)
-    index = (lstLen - 1) // 2
-    if (lstLen % 2):
-        return sortedLst[index]
-    else:
-        return (sortedLst[index] + sortedLst[index + 1]) / 2.0
+    return float(computeStatistics(vals, ['median'])['median'])
 
 '''
 
-  Function: 	getLatestForecastTime
-  Purpose:  	For caching purposes, compare this time to cached time to see if
-		the cached variable needs to be updated
+  Function:	computeStatistics
+  Purpose:	Reduce an array of values along an axis in one vectorized pass per
+		statistic, ignoring missing values. Return a dict of the requested
+		statistics, each an array with the reduced axis removed.
+  Params:
+	vals:	Array of values. NaN and masked values are treated as missing.
+		A (time, window) array with axis=-1 gives statistics per time step
+	stats:	Optional list of statistics to compute, any of STATISTICS.
+		Default is all of them. Statistics not requested are not computed.
+	axis:	The axis to reduce along, or None for all values. Default = None
 
 '''
-def getLatestForecastTime():
+def computeStatistics(vals, stats=None, axis=None):
+    if stats == None:
+        stats = STATISTICS
+    for stat in stats:
+        if not stat in STATISTICS:
+            raise ValueError('Invalid statistic: ' + str(stat))
+    vals = np.ma.filled(np.ma.asarray(vals, dtype=float), np.nan)
+
+    results = { }
+    if vals.size == 0:
+        shape = () if axis == None else tuple(np.delete(vals.shape, axis))
+        for stat in stats:
+            results[stat] = np.full(shape, np.nan)
+        return results
+
+    with warnings.catch_warnings():
+        # all missing windows reduce to NaN, which is the intended result
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for stat in stats:
+            results[stat] = STATISTICS[stat](vals, axis=axis)
+    return results
+
+'''
+
+  Class:	RunningStatistics
+  Purpose:	Accumulate statistics over batches of values without keeping them, for
+		analyses that stream their results. Means and standard deviations are
+		merged batch by batch, so they stay accurate over long horizons. The
+		median needs every value and is not available.
+  Params:
+	None
+
+'''
+class RunningStatistics(object):
+    STATISTICS = ['min', 'max', 'mean', 'stdDev', 'sum']
+
+    def __init__(self):
+        self.count = 0
+        self.min = float('nan')
+        self.max = float('nan')
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.sum = 0.0
+
+    def update(self, vals):
+        vals = np.ma.filled(np.ma.asarray(vals, dtype=float), np.nan).ravel()
+        vals = vals[~np.isnan(vals)]
+        if vals.size == 0:
+            return
+        mean = vals.mean()
+        m2 = ((vals - mean) ** 2).sum()
+        count = self.count + vals.size
+        delta = mean - self.mean
+        self.m2 += m2 + delta ** 2 * self.count * vals.size / count
+        self.mean += delta * vals.size / count
+        self.count = count
+        self.sum += vals.sum()
+        self.min = np.fmin(self.min, vals.min())
+        self.max = np.fmax(self.max, vals.max())
+
+    def getStatistics(self, stats=None):
+        if stats == None:
+            stats = self.STATISTICS
+        results = { }
+        for stat in stats:
+            if not stat in STATISTICS:
+                raise ValueError('Invalid statistic: ' + str(stat))
+            if not stat in self.STATISTICS:
+                continue
+            if self.count == 0:
+                results[stat] = float('nan')
+            elif stat == 'mean':
+                results[stat] = float(self.mean)
+            elif stat == 'stdDev':
+                results[stat] = float(np.sqrt(self.m2 / self.count))
+            else:
+                results[stat] = float(getattr(self, stat))
+        return results
+
+'''
+
+  Function: 	getAvailableForecastTime
+  Purpose:  	Return the latest forecast cycle the servers can be expected to have,
+		allowing CACHE_SERVER_BUFFER_MIN minutes after each hour for it to appear
+
+'''
+def getAvailableForecastTime():
     latestTime = datetime.utcnow()
     if latestTime.minute <= CACHE_SERVER_BUFFER_MIN:
         latestTime = (datetime.utcnow() - timedelta(hours=1))
     return latestTime.replace(minute=0, second=0, microsecond=0)
 
+'''
+
+  Function: 	getLatestForecastTime
+  Purpose:  	For caching purposes, compare this time to cached time to see if
+		the cached variable needs to be updated
+  Notes:
+	- While a prefetch daemon is running this is the latest cycle the daemon
+	  has finished warming, see startPrefetchDaemon
+
+'''
+def getLatestForecastTime():
+    if READY_FORECAST_TIME != None:
+        return READY_FORECAST_TIME
+    return getAvailableForecastTime()
+
+'''
+
+  Function:	getCycleDir
+  Purpose:	Return the local cache directory of a forecast cycle
+  Params:
+	forecastTime:	Optional forecast cycle. Default is the latest forecast time
+
+'''
+def getCycleDir(forecastTime=None):
+    if forecastTime == None:
+        forecastTime = getLatestForecastTime()
+    return NDFD_TMP + forecastTime.strftime('%Y-%m-%d-%H') + path.sep
+
+'''
+
+  Function:	getServer
+  Purpose:	Return the server NDFD variables are retrieved from
+
+'''
+def getServer():
+    if NDFD_LOCAL_SERVER != None:
+        return NDFD_LOCAL_SERVER
+    return NDFD_REMOTE_SERVER
+
+'''
+
+  Function:	_getConnection
+  Purpose:	Return this thread's persistent keep-alive connection to a server,
+		opening it if needed
+  Params:
+	scheme:	The URI scheme, http or https
+	netloc:	The host and port of the server
+	reset:	Whether to close and reopen an existing connection. Default = False
+
+'''
+def _getConnection(scheme, netloc, reset=False):
+    if not hasattr(HTTP_CONNECTIONS, 'pool'):
+        HTTP_CONNECTIONS.pool = { }
+    key = (scheme, netloc)
+    if reset and key in HTTP_CONNECTIONS.pool:
+        HTTP_CONNECTIONS.pool.pop(key).close()
+    if not key in HTTP_CONNECTIONS.pool:
+        if scheme == 'https':
+            HTTP_CONNECTIONS.pool[key] = HTTPSConnection(netloc, timeout=DOWNLOAD_TIMEOUT)
+        else:
+            HTTP_CONNECTIONS.pool[key] = HTTPConnection(netloc, timeout=DOWNLOAD_TIMEOUT)
+    return HTTP_CONNECTIONS.pool[key]
+
+'''
+
+  Function:	_request
+  Purpose:	Send a GET request over this thread's keep-alive connection to the
+		server and return the response. Redirects are followed, up to
+		DOWNLOAD_MAX_REDIRECTS of them, and the URL the response came from is
+		set as its url attribute.
+  Params:
+	url:		The parsed URL to request
+	headers:	Dict of extra request headers
+
+'''
+def _request(url, headers):
+    for redirect in range(DOWNLOAD_MAX_REDIRECTS + 1):
+        reqPath = url.path
+        if url.query:
+            reqPath += '?' + url.query
+        try:
+            conn = _getConnection(url.scheme, url.netloc)
+            conn.request('GET', reqPath, headers=headers)
+            resp = conn.getresponse()
+        except (HTTPException, socket.error):
+            # the server may have closed an idle keep-alive connection, retry once on a new one
+            conn = _getConnection(url.scheme, url.netloc, reset=True)
+            conn.request('GET', reqPath, headers=headers)
+            resp = conn.getresponse()
+        resp.url = url
+
+        location = resp.getheader('location')
+        if not resp.status in (301, 302, 303, 307, 308) or location == None:
+            return resp
+        resp.read()
+        url = urlparse(urljoin(urlunparse(url), location))
+        if not url.scheme in ('http', 'https'):
+            raise RuntimeError('Cannot follow redirect to ' + location)
+    raise RuntimeError('Too many redirects for ' + urlunparse(url))
+
+'''
+
+  Function:	downloadFile
+  Purpose:	Download a remote file to a local path. HTTP(S) downloads reuse a
+		persistent keep-alive connection per thread and server, and are kept
+		in a content-addressed object store along with the ETag/Last-Modified
+		validators the server sent. If the file was downloaded before, it is
+		revalidated with a conditional GET and a 304 response reuses the stored
+		object. The local path is a link to the object, put in place atomically.
+		Downloads of a file are serialized across threads and processes by a
+		FileLock, so workers sharing a cache share one download per file.
+  Params:
+	uri:		The URI of the remote file
+	localPath:	The local path to save the file to
+	missingOnly:	Only download if the local path does not exist once the lock is
+			held, for callers racing to fill the cache. Default = False
+
+'''
+def downloadFile(uri, localPath, missingOnly=False):
+    with _cacheLock():
+        with FileLock(NDFD_LOCK.format(localPath)):
+            if missingOnly and path.isfile(localPath):
+                return
+            _downloadFile(uri, localPath)
+
+def _downloadFile(uri, localPath):
+    url = urlparse(uri)
+    if url.scheme not in ('http', 'https'):
+        fd, tmp = mkstemp(dir=path.dirname(localPath), prefix='.tmp')
+        close(fd)
+        try:
+            urlretrieve(uri, tmp)
+            rename(tmp, localPath)
+        except:
+            try: remove(tmp)
+            except OSError: pass
+            raise
+        return
+
+    validators = _loadValidators(uri)
+    headers = { }
+    if validators != None:
+        if validators.get('etag') != None:
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('lastModified') != None:
+            headers['If-Modified-Since'] = validators['lastModified']
+    resp = _request(url, headers)
+
+    if resp.status == 304 and validators != None:
+        resp.read()
+        _linkObject(validators['object'], localPath)
+        return
+    if resp.status != 200:
+        resp.read()
+        raise RuntimeError('Cannot retrieve NDFD variables at this time (HTTP ' + str(resp.status) + ' for ' + uri + '). Try again in a moment.')
+
+    digest = _storeObject(resp)
+    _saveValidators(uri, resp.getheader('etag'), resp.getheader('last-modified'), digest)
+    if validators != None and validators['object'] != digest:
+        # the contents changed, so anything decoded from the old file is stale
+        rmtree(_sharedPath(NDFD_DECODED.format(localPath)), ignore_errors=True)
+        rmtree(NDFD_DECODED.format(localPath), ignore_errors=True)
+    _linkObject(digest, localPath)
+
+'''
+
+  Function:	_storeObject
+  Purpose:	Stream an HTTP response into the object store under the SHA-1 of its
+		contents and return the digest
+  Params:
+	resp:	The HTTP response to read
+
+'''
+def _storeObject(resp):
+    objDir = NDFD_TMP + NDFD_OBJECTS
+    if not path.isdir(objDir):
+        try: makedirs(objDir)
+        except OSError: pass
+    sha = hashlib.sha1()
+    fd, tmp = mkstemp(dir=objDir, prefix='.tmp')
+    try:
+        f = fdopen(fd, 'wb')
+        try:
+            while True:
+                chunk = resp.read(DOWNLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                sha.update(chunk)
+                f.write(chunk)
+        finally: f.close()
+        digest = sha.hexdigest()
+        rename(tmp, objDir + digest)
+    except:
+        try: remove(tmp)
+        except OSError: pass
+        raise
+    return digest
+
+'''
+
+  Function:	_linkObject
+  Purpose:	Atomically put a stored object at a local path, as a hard link where
+		the filesystem supports it, otherwise as a copy
+  Params:
+	digest:		The digest of the stored object
+	localPath:	The local path to put the object at
+
+'''
+def _linkObject(digest, localPath):
+    obj = NDFD_TMP + NDFD_OBJECTS + digest
+    fd, tmp = mkstemp(dir=path.dirname(localPath), prefix='.tmp')
+    close(fd)
+    try:
+        remove(tmp)
+        try: link(obj, tmp)
+        except (OSError, AttributeError): copyfile(obj, tmp)
+        rename(tmp, localPath)
+    except:
+        try: remove(tmp)
+        except OSError: pass
+        raise
+
+'''
+
+  Function:	_loadValidators
+  Purpose:	Return the stored validators of a URI, or None if it was never
+		downloaded or its object is no longer in the store
+  Params:
+	uri:	The URI of the remote file
+
+'''
+def _loadValidators(uri):
+    validatorsFile = NDFD_TMP + NDFD_VALIDATORS + hashlib.sha1(uri).hexdigest() + '.json'
+    try:
+        with open(validatorsFile) as f:
+            validators = json.load(f)
+    except (IOError, ValueError):
+        return None
+    if not path.isfile(NDFD_TMP + NDFD_OBJECTS + validators['object']):
+        return None
+    return validators
+
+'''
+
+  Function:	_saveValidators
+  Purpose:	Store the validators of a downloaded URI along with its object digest
+  Params:
+	uri:		The URI of the remote file
+	etag:		The ETag header of the response, or None
+	lastModified:	The Last-Modified header of the response, or None
+	digest:		The digest of the stored object
+
+'''
+def _saveValidators(uri, etag, lastModified, digest):
+    validatorsDir = NDFD_TMP + NDFD_VALIDATORS
+    if not path.isdir(validatorsDir):
+        try: makedirs(validatorsDir)
+        except OSError: pass
+    validators = { 'uri': uri, 'etag': etag, 'lastModified': lastModified, 'object': digest }
+    _atomicWrite(validatorsDir + hashlib.sha1(uri).hexdigest() + '.json', lambda f: json.dump(validators, f))
+
+'''
+
+  Function:	cleanCache
+  Purpose:	Remove all but the CACHE_KEEP_CYCLES most recent forecast cycle
+		directories, along with their decoded grids in SHARED_MEMORY_DIR, then
+		remove stored objects that are neither linked from a cycle directory
+		nor referenced by stored validators. Nothing is removed
+		while another thread or process is writing into the cache; the cache is
+		cleaned again with the next cycle instead.
+
+'''
+def cleanCache():
+    if not path.isdir(NDFD_TMP):
+        return
+    with _cacheLock(shared=False, blocking=False) as locked:
+        if locked:
+            _cleanCache()
+
+def _cleanCache():
+    for root in (NDFD_TMP, SHARED_MEMORY_DIR):
+        if root == None or not path.isdir(root):
+            continue
+        cycles = []
+        for name in listdir(root):
+            try: cycles.append((datetime.strptime(name, '%Y-%m-%d-%H'), name))
+            except ValueError: pass
+        for cycle, name in sorted(cycles)[:-CACHE_KEEP_CYCLES]:
+            rmtree(root + name, ignore_errors=True)
+
+    objDir = NDFD_TMP + NDFD_OBJECTS
+    validatorsDir = NDFD_TMP + NDFD_VALIDATORS
+    if not path.isdir(objDir):
+        return
+    referenced = set()
+    if path.isdir(validatorsDir):
+        for name in listdir(validatorsDir):
+            try:
+                with open(validatorsDir + name) as f:
+                    referenced.add(json.load(f)['object'])
+            except (IOError, ValueError, KeyError):
+                pass
+    for name in listdir(objDir):
+        if name in referenced or name.startswith('.tmp'):
+            continue
+        try:
+            if stat(objDir + name).st_nlink <= 1:
+                remove(objDir + name)
+        except OSError:
+            pass
+
+'''
+
+  Function:	_getDownloadPool
+  Purpose:	Return the bounded thread pool used for downloads, creating it on first use.
+		Its threads live for the life of the process so their connections stay alive.
+
+'''
+def _getDownloadPool():
+    global DOWNLOAD_POOL
+    with DOWNLOAD_POOL_LOCK:
+        if DOWNLOAD_POOL == None:
+            DOWNLOAD_POOL = ThreadPool(DOWNLOAD_THREADS)
+    return DOWNLOAD_POOL
+
+'''
+
+  Function:	_getDecodePool
+  Purpose:	Return the bounded thread pool used to fetch and decode several variables
+		at once, creating it on first use. It is separate from the download pool
+		because its tasks submit downloads to the download pool and wait on them.
+
+'''
+def _getDecodePool():
+    global DECODE_POOL
+    with DECODE_POOL_LOCK:
+        if DECODE_POOL == None:
+            DECODE_POOL = ThreadPool(DECODE_THREADS)
+    return DECODE_POOL
+
+'''
+
+  Function:	downloadFiles
+  Purpose:	Download several remote files concurrently with the download pool.
+		Files already cached locally are skipped.
+  Params:
+	files:	List of (uri, localPath) tuples
+
+'''
+def downloadFiles(files):
+    missing = [f for f in files if not path.isfile(f[1])]
+    if len(missing) == 1:
+        downloadFile(missing[0][0], missing[0][1], True)
+    elif len(missing) > 1:
+        _getDownloadPool().map(lambda f: downloadFile(f[0], f[1], True), missing)
+    for uri, localPath in files:
+        if not path.isfile(localPath):
+            raise RuntimeError('Cannot retrieve NDFD variables at this time. Try again in a moment.')
+
+'''
+
+  Function:	_getVariableFiles
+  Purpose:	Return the (uri, localPath) tuples of the files making up a variable
+		in an area for a forecast cycle, creating the local directories
+  Params:
+	var:		The NDFD variable
+	area:		The NDFD grid area
+	forecastTime:	Optional forecast cycle. Default is the latest forecast time
+
+'''
+def _getVariableFiles(var, area, forecastTime=None):
+    if not area in DEFS['vars']:
+        raise ValueError('Invalid Area: ' + str(area))
+
+    dirTime = getCycleDir(forecastTime)
+    if not path.isdir(dirTime):
+        try: makedirs(dirTime)
+        except OSError: pass
+        cleanCache()
+
+    files = []
+    for vp in DEFS['vars'][area]:
+        if var in DEFS['vars'][area][vp]:
+            varDir = NDFD_DIR.format(area, vp)
+            varName = varDir + NDFD_VAR.format(var)
+            localDir = dirTime + varDir
+            if not path.isdir(localDir):
+                try: makedirs(localDir)
+                except OSError: pass
+            files.append((getServer() + varName, dirTime + varName))
+    return files
+
+'''
+
+  Function:	_requestRange
+  Purpose:	Request a byte range of a remote file. Return the bytes, the total
+		size of the file and its validator, see _getRangeValidator, or None if
+		the server does not support range requests or, when a validator is
+		given, the file no longer matches it.
+  Params:
+	url:		The parsed URL of the remote file
+	start:		The first byte to request
+	end:		The last byte to request (inclusive)
+	validator:	Optional validator of the file the range must come from, sent
+			as If-Range
+
+'''
+def _requestRange(url, start, end, validator=None):
+    headers = { 'Range': 'bytes={0}-{1}'.format(start, end) }
+    if validator != None:
+        headers['If-Range'] = validator
+    resp = _request(url, headers)
+    if resp.status == 206:
+        data = resp.read()
+        try: size = int(resp.getheader('content-range').rsplit('/', 1)[1])
+        except: size = None
+        return data, size, _getRangeValidator(resp)
+    if resp.status == 416:
+        resp.read()
+        return '', None, _getRangeValidator(resp)
+    if resp.status == 200:
+        # the whole file is on its way, drop the connection rather than reading it
+        _getConnection(resp.url.scheme, resp.url.netloc, reset=True)
+        return None
+    resp.read()
+    raise RuntimeError('Cannot retrieve NDFD variables at this time (HTTP ' + str(resp.status) + ' for ' + urlunparse(url) + '). Try again in a moment.')
+
+'''
+
+  Function:	_getRangeValidator
+  Purpose:	Return the validator of a response that can be sent back as If-Range:
+		its ETag if it is a strong one, otherwise its Last-Modified date, or
+		None if it has neither
+  Params:
+	resp:	The HTTP response
+
+'''
+def _getRangeValidator(resp):
+    etag = resp.getheader('etag')
+    if etag != None and not etag.startswith('W/'):
+        return etag
+    return resp.getheader('last-modified')
+
+'''
+
+  Function:	buildMessageIndex
+  Purpose:	Build an index of the grib messages in a remote file, similar to a
+		wgrib2 .idx file, by walking the GRIB2 section headers with small range
+		requests. Return a dict with the validator of the file the index was
+		built from and the list of messages, dicts with the message number,
+		byte offset, length and valid time of each message, or None if the
+		server does not support range requests.
+  Params:
+	uri:	The URI of the remote grib file
+
+'''
+def buildMessageIndex(uri):
+    url = urlparse(uri)
+    chunk = { 'start': 0, 'data': '', 'size': None, 'validator': None }
+
+    def read(pos, length):
+        if pos < chunk['start'] or pos + length > chunk['start'] + len(chunk['data']):
+            # every read after the first must come from the same version of the file
+            result = _requestRange(url, pos, pos + max(length, INDEX_CHUNK_SIZE) - 1, chunk['validator'])
+            if result == None:
+                return None
+            chunk['start'] = pos
+            chunk['data'], size, validator = result
+            if size != None:
+                chunk['size'] = size
+            if chunk['validator'] == None:
+                chunk['validator'] = validator
+        return chunk['data'][pos - chunk['start']:pos - chunk['start'] + length]
+
+    index = []
+    offset = 0
+    while chunk['size'] == None or offset < chunk['size']:
+        head = read(offset, 16)
+        if head == None:
+            return None
+        if len(head) < 16 or head[:4] != 'GRIB':
+            break
+        length = struct.unpack('>Q', head[8:16])[0]
+
+        refTime = None
+        validTime = None
+        pos = offset + 16
+        while pos < offset + length - 4 and validTime == None:
+            secHead = read(pos, 5)
+            if secHead == None:
+                return None
+            secLen, secNum = struct.unpack('>IB', secHead)
+            if secNum == 1:
+                sec = read(pos, 19)
+                year, month, day, hour = struct.unpack('>HBBB', sec[12:17])
+                refTime = datetime(year, month, day, hour)
+            elif secNum == 4:
+                sec = read(pos, 22)
+                unit = ord(sec[17])
+                forecastTime = struct.unpack('>I', sec[18:22])[0]
+                validTime = refTime + timedelta(hours=forecastTime * FORECAST_TIME_UNITS.get(unit, 1))
+            pos += secLen
+
+        message = { }
+        message['number'] = len(index) + 1
+        message['offset'] = offset
+        message['length'] = length
+        message['validTime'] = validTime.strftime('%Y-%m-%d %H:%M:%S')
+        index.append(message)
+        offset += length
+
+    return { 'validator': chunk['validator'], 'messages': index }
+
+'''
+
+  Function:	_getMessageIndex
+  Purpose:	Return the message index of a remote grib file, see buildMessageIndex,
+		building it and saving it next to the local file the first time.
+		Return None if the server does not support range requests.
+  Params:
+	uri:		The URI of the remote grib file
+	localPath:	The local path of the full grib file
+	stale:		Optional index that no longer matches the remote file. If it is
+			still the saved index, the index is rebuilt and the messages
+			fetched with it are removed.
+
+'''
+def _getMessageIndex(uri, localPath, stale=None):
+    indexFile = localPath + NDFD_MESSAGE_INDEX
+    index = _loadMessageIndex(indexFile)
+    if index == None or index == stale:
+        with _cacheLock():
+            with FileLock(NDFD_LOCK.format(indexFile)):
+                index = _loadMessageIndex(indexFile)
+                if index == None or index == stale:
+                    if index != None:
+                        msgDir = NDFD_MESSAGES.format(localPath)
+                        rmtree(_sharedPath(msgDir), ignore_errors=True)
+                        rmtree(msgDir, ignore_errors=True)
+                    index = buildMessageIndex(uri)
+                    if index == None:
+                        return None
+                    _atomicWrite(indexFile, lambda f: json.dump(index, f))
+    return index
+
+def _loadMessageIndex(indexFile):
+    try:
+        with open(indexFile) as f:
+            index = json.load(f)
+    except (IOError, ValueError):
+        return None
+    # indexes saved without a validator are rebuilt
+    if not isinstance(index, dict):
+        return None
+    return index
+
+'''
+
+  Function:	_getVariableMessages
+  Purpose:	Cache only the messages of a remote grib file that are valid between
+		minTime and maxTime, fetching each with a range request into its own
+		single message grib file. Ranges are requested with If-Range and must
+		hold a whole GRIB message. Otherwise the remote file changed since it
+		was indexed, and the index is rebuilt once. Return the paths of those
+		files, or None if the server does not support range requests.
+  Params:
+	uri:		The URI of the remote grib file
+	localPath:	The local path of the full grib file
+	minTime:	Optional minimum valid time
+	maxTime:	Optional maximum valid time
+
+'''
+def _getVariableMessages(uri, localPath, minTime, maxTime):
+    index = _getMessageIndex(uri, localPath)
+    if index == None:
+        return None
+
+    msgDir = NDFD_MESSAGES.format(localPath)
+    url = urlparse(uri)
+    def fetch(message):
+        msgPath = msgDir + '{0:04d}.bin'.format(message['number'])
+        if path.isfile(msgPath):
+            return msgPath
+        with _cacheLock():
+            with FileLock(NDFD_LOCK.format(msgPath)):
+                if not path.isfile(msgPath):
+                    result = _requestRange(url, message['offset'], message['offset'] + message['length'] - 1, index['validator'])
+                    if result == None:
+                        return None
+                    data = result[0]
+                    if len(data) != message['length'] or data[:4] != 'GRIB' or data[-4:] != '7777':
+                        return None
+                    _atomicWrite(msgPath, lambda f: f.write(data))
+        return msgPath
+
+    for attempt in range(2):
+        if not path.isdir(msgDir):
+            try: makedirs(msgDir)
+            except OSError: pass
+        selected = []
+        for message in index['messages']:
+            t = datetime.strptime(message['validTime'], '%Y-%m-%d %H:%M:%S')
+            if minTime != None and t < minTime:
+                continue
+            if maxTime != None and t > maxTime:
+                continue
+            selected.append(message)
+        if len(selected) > 1:
+            paths = _getDownloadPool().map(fetch, selected)
+        else:
+            paths = [fetch(message) for message in selected]
+        if not None in paths:
+            return paths
+
+        # the remote file changed since it was indexed
+        index = _getMessageIndex(uri, localPath, index)
+        if index == None:
+            return None
+    raise RuntimeError('Cannot retrieve NDFD variables at this time. Try again in a moment.')
+
 '''
 
   Function:	getVariable
   Purpose:	Cache the requested variable if not already cached and return
 		the paths of the cached files
   Params:
-	var:	The NDFD variable to retrieve
-	area:	The NDFD grid area to retrieve
+	var:		The NDFD variable to retrieve
+	area:		The NDFD grid area to retrieve
+	minTime:	Optional minimum valid time of the messages needed
+	maxTime:	Optional maximum valid time of the messages needed
+  Notes:
+	- When minTime or maxTime is given and the server supports range requests,
+	  only the messages inside the window are downloaded and the returned paths
+	  are single message grib files
 
 '''
-def getVariable(var, area):
-    gribs = []
-    dirTime = NDFD_TMP + getLatestForecastTime().strftime('%Y-%m-%d-%H') + path.sep
-    if not path.isdir(dirTime):
-        try: rmtree(NDFD_TMP)
-        except: pass
-        makedirs(dirTime)
-    if area in DEFS['vars']:
-        for vp in DEFS['vars'][area]:
-            if var in DEFS['vars'][area][vp]:
-                varDir = NDFD_DIR.format(area, vp)
-                varName = varDir + NDFD_VAR.format(var)
-                localDir = dirTime + varDir
-                localVar = dirTime + varName
-                if not path.isdir(localDir):
-                    makedirs(localDir)
-                if not path.isfile(localVar):
-                    if NDFD_LOCAL_SERVER != None:
-                        remoteVar = NDFD_LOCAL_SERVER + varName
-                        urlretrieve(remoteVar, localVar)
-                    else:
-                        remoteVar = NDFD_REMOTE_SERVER + varName
-                        urlretrieve(remoteVar, localVar)
-                if not path.isfile(localVar):
-                    raise RuntimeError('Cannot retrieve NDFD variables at this time. Try again in a moment.')
-                gribs.append(localVar)
-    else:
-        raise ValueError('Invalid Area: ' + str(area))
+def getVariable(var, area, minTime=None, maxTime=None):
+    files = _getVariableFiles(var, area)
+    if minTime == None and maxTime == None:
+        downloadFiles(files)
+        return [localPath for uri, localPath in files]
 
+    gribs = []
+    for uri, localPath in files:
+        messages = None
+        if not path.isfile(localPath) and urlparse(uri).scheme in ('http', 'https'):
+            messages = _getVariableMessages(uri, localPath, minTime, maxTime)
+        if messages == None:
+            downloadFiles([(uri, localPath)])
+            messages = [localPath]
+        gribs.extend(messages)
     return gribs
 
+'''
+
+  Function:	prefetch
+  Purpose:	Cache many variables in many areas at once, downloading all of the files
+		concurrently. Return a dict of the cached file paths by (var, area).
+  Params:
+	vars:		List of NDFD variables to retrieve
+	areas:		List of NDFD grid areas to retrieve
+	forecastTime:	Optional forecast cycle. Default is the latest forecast time
+  Notes:
+	- Variables that are not available in an area are skipped
+
+'''
+def prefetch(vars, areas, forecastTime=None):
+    files = { }
+    for area in areas:
+        for var in vars:
+            varFiles = _getVariableFiles(var, area, forecastTime)
+            if len(varFiles) > 0:
+                files[(var, area)] = varFiles
+    downloadFiles([f for varFiles in files.values() for f in varFiles])
+    return dict((key, [localPath for uri, localPath in files[key]]) for key in files)
+
+'''
+
+  Class:	PrefetchDaemon
+  Purpose:	Background thread that watches for new forecast cycles and downloads,
+		and optionally decodes, a set of variables and areas for each one. The
+		latest forecast time only switches to a new cycle once it is ready, so
+		foreground requests never wait on a cold cache.
+  Params:
+	vars:		List of NDFD variables to warm
+	areas:		List of NDFD grid areas to warm
+	decode:		Whether to also fill the decoded cache. Default = True
+	interval:	Seconds between checks for a new cycle. Default = PREFETCH_INTERVAL_SEC
+
+'''
+class PrefetchDaemon(Thread):
+    def __init__(self, vars, areas, decode=True, interval=PREFETCH_INTERVAL_SEC):
+        Thread.__init__(self, name='pyndfd-prefetch')
+        self.daemon = True
+        self.vars = list(vars)
+        self.areas = list(areas)
+        self.decode = decode
+        self.interval = interval
+        self.stopped = Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.warm()
+            except Exception as e:
+                stderr.write('WARNING: Unable to prefetch the next NDFD cycle: ' + str(e) + '\n'); stderr.flush()
+            self.stopped.wait(self.interval)
+
+    def warm(self):
+        global READY_FORECAST_TIME
+        forecastTime = getAvailableForecastTime()
+        if forecastTime == READY_FORECAST_TIME:
+            return
+        files = prefetch(self.vars, self.areas, forecastTime)
+        if self.decode:
+            for paths in files.values():
+                for g in paths:
+                    getDecodedMessages(g)
+        with PREFETCH_LOCK:
+            # a daemon that was stopped or replaced while warming must not publish
+            if self.stopped.is_set() or PREFETCH_DAEMON is not self:
+                return
+            READY_FORECAST_TIME = forecastTime
+
+    def stop(self):
+        self.stopped.set()
+
+'''
+
+  Function:	startPrefetchDaemon
+  Purpose:	Start the background prefetch daemon, see PrefetchDaemon. The first
+		cycle is warmed before returning so the daemon is in charge of the
+		latest forecast time from the start.
+  Params:
+	vars:		List of NDFD variables to warm
+	areas:		List of NDFD grid areas to warm
+	decode:		Whether to also fill the decoded cache. Default = True
+	interval:	Seconds between checks for a new cycle. Default = PREFETCH_INTERVAL_SEC
+
+'''
+def startPrefetchDaemon(vars, areas, decode=True, interval=PREFETCH_INTERVAL_SEC):
+    global PREFETCH_DAEMON
+    stopPrefetchDaemon()
+    daemon = PrefetchDaemon(vars, areas, decode, interval)
+    with PREFETCH_LOCK:
+        PREFETCH_DAEMON = daemon
+    daemon.warm()
+    daemon.start()
+    return daemon
+
+'''
+
+  Function:	stopPrefetchDaemon
+  Purpose:	Stop the background prefetch daemon if one is running and wait for it
+		to finish. The latest forecast time goes back to following the clock.
+
+'''
+def stopPrefetchDaemon():
+    global PREFETCH_DAEMON, READY_FORECAST_TIME
+    with PREFETCH_LOCK:
+        daemon = PREFETCH_DAEMON
+        if daemon != None:
+            daemon.stop()
+        PREFETCH_DAEMON = None
+        READY_FORECAST_TIME = None
+    if daemon != None and daemon.is_alive() and daemon is not current_thread():
+        daemon.join()
+
 '''
 
   Function:	getElevationVariable
@@ -199,257 +1284,1607 @@ def getElevationVariable(area):
     localVar = localDir + NDFD_VAR.format('elev')
     if not path.isdir(localDir):
         makedirs(localDir)
-    if not path.isfile(localVar):
-        urlretrieve(remoteVar, localVar)
-    if not path.isfile(localVar):
-        raise RuntimeError('Cannot retrieve NDFD variables at this time. Try again in a moment.')
+    forecastTime = getLatestForecastTime()
+    revalidated = STATIC_REVALIDATED.get(localVar)
+    if revalidated == None or (revalidated[0] != forecastTime and datetime.utcnow() >= revalidated[1]):
+        # the static file rarely changes, so revalidate it once per cycle instead of removing it
+        try:
+            downloadFile(remoteVar, localVar)
+            STATIC_REVALIDATED[localVar] = (forecastTime, datetime.utcnow())
+        except (RuntimeError, IOError, HTTPException, socket.error) as e:
+            if not path.isfile(localVar):
+                raise
+            # keep using the cached file and try again in a while
+            STATIC_REVALIDATED[localVar] = (revalidated[0] if revalidated != None else None, datetime.utcnow() + timedelta(seconds=STATIC_RETRY_SEC))
+            stderr.write('WARNING: Unable to revalidate ' + localVar + ', using the cached file: ' + str(e) + '\n'); stderr.flush()
+    downloadFiles([(remoteVar, localVar)])
     return localVar
 
 '''
 
-  Function:	getSmallestGrid
-  Purpose:	Use the provided lat, lon coordinates to find the smallest
-		NDFD area that contains those coordinates. Return the name of the area.
+  Class:	DecodedMessage
+  Purpose:	A decoded grib message from the on-disk decoded cache. Behaves like a
+		pygrib message for the keys in DECODED_KEYS, projparams, messagenumber
+		and values, which is a read-only memory-mapped DECODED_DTYPE numpy array
+		with missing values set to NaN.
+  Params:
+	cacheDir:	The decoded cache directory of the grib file
+	meta:		The message's entry in the decoded cache index
+	gribPath:	Optional path of the grib file, to decode the message from when
+			its values are first read if it is not in the decoded cache yet,
+			see decodeGribMessage
+
+'''
+class DecodedMessage(object):
+    def __init__(self, cacheDir, meta, gribPath=None):
+        self.meta = meta
+        self.cacheDir = cacheDir
+        self.gribPath = gribPath
+        self.path = cacheDir + meta['file']
+        self.projparams = meta['projparams']
+        self.messagenumber = meta['messagenumber']
+        self.validTime = datetime.strptime(meta['validTime'], '%Y-%m-%d %H:%M:%S')
+        self._values = None
+
+    def __getitem__(self, key):
+        return self.meta['keys'][key]
+
+    @property
+    def values(self):
+        if self._values is None:
+            if self.gribPath != None and not path.isfile(self.path):
+                with _cacheLock():
+                    with FileLock(NDFD_DECODE_LOCK.format(self.gribPath)):
+                        if not path.isfile(self.path):
+                            decodeGribMessage(self.gribPath, self.cacheDir, self.messagenumber, self.meta['keys'].get('offset'))
+            self._values = np.load(self.path, mmap_mode='r')
+        return self._values
+
+'''
+
+  Function:	indexGribFile
+  Purpose:	Write the message table of a grib file to its decoded cache directory.
+		The table holds the metadata of every message, including its valid time,
+		and is built from the message headers only, without decoding any values.
+  Params:
+	gribPath:	The path of the grib file to index
+	cacheDir:	The decoded cache directory of the grib file
+
+'''
+def indexGribFile(gribPath, cacheDir):
+    if not path.isdir(cacheDir):
+        try: makedirs(cacheDir)
+        except OSError: pass
+    table = []
+    grbs = pygrib.open(gribPath)
+    for grb in grbs:
+        keys = { }
+        for key in DECODED_KEYS:
+            try: val = grb[key]
+            except: continue
+            keys[key] = val.item() if hasattr(val, 'item') else val
+        validTime = datetime(grb['year'], grb['month'], grb['day'], grb['hour']) + timedelta(hours=grb['forecastTime'])
+        meta = { }
+        meta['messagenumber'] = grb.messagenumber
+        meta['file'] = '{0:04d}.npy'.format(grb.messagenumber)
+        meta['validTime'] = validTime.strftime('%Y-%m-%d %H:%M:%S')
+        meta['projparams'] = grb.projparams
+        meta['keys'] = keys
+        table.append(meta)
+    grbs.close()
+    _atomicWrite(cacheDir + NDFD_DECODED_INDEX, lambda f: json.dump(table, f))
+
+'''
+
+  Function:	decodeGribFile
+  Purpose:	Decode messages of a grib file into the decoded cache directory, one
+		.npy file per message, in a single pass over the file. Values are stored
+		as DECODED_DTYPE, which holds the NDFD packing precision at half the
+		size of float64. Files are written to a temporary name and renamed
+		into place so other processes never see partial files.
   Params:
-	lat:	Latitude 
-	lon:	Longitude
+	gribPath:	The path of the grib file to decode
+	cacheDir:	The directory to write the decoded messages to
+	messagenumbers:	Optional collection of the message numbers to decode. Default is
+			every message in the file
+
+'''
+def decodeGribFile(gribPath, cacheDir, messagenumbers=None):
+    if not path.isdir(cacheDir):
+        try: makedirs(cacheDir)
+        except OSError: pass
+    if messagenumbers != None:
+        messagenumbers = set(messagenumbers)
+        if len(messagenumbers) == 0:
+            return
+        last = max(messagenumbers)
+    grbs = pygrib.open(gribPath)
+    for grb in grbs:
+        if messagenumbers != None:
+            if grb.messagenumber > last:
+                break
+            if not grb.messagenumber in messagenumbers:
+                continue
+        values = getGridValues(grb).astype(DECODED_DTYPE)
+        _atomicWrite(cacheDir + '{0:04d}.npy'.format(grb.messagenumber), lambda f: np.save(f, values))
+    grbs.close()
 
 '''
-def getSmallestGrid(lat, lon):
-    smallest = 'neast'
-    minDist = G.inv(lon, lat, DEFS['grids'][smallest]['lonC'], DEFS['grids'][smallest]['latC'])
 
-    for area in DEFS['grids'].keys():
-        if area == 'conus' or area == 'nhemi' or area == 'npacocn':
-            continue
-        curArea = DEFS['grids'][area]
-        smallArea = DEFS['grids'][smallest]
-        dist = G.inv(lon, lat, curArea['lonC'], curArea['latC'])[-1]
-        if dist < minDist:
-            minDist = dist
-            smallest = area
+  Function:	decodeGribMessage
+  Purpose:	Decode a single message of a grib file into the decoded cache directory,
+		like decodeGribFile, reading only that message's bytes from the file
+		instead of walking the messages before it. Files that are not grib2 are
+		decoded with decodeGribFile.
+  Params:
+	gribPath:	The path of the grib file
+	cacheDir:	The directory to write the decoded message to
+	messagenumber:	The number of the message in the file
+	offset:		Optional byte offset of the message in the file. Found from the
+			file's message headers if not given
+
+'''
+def decodeGribMessage(gribPath, cacheDir, messagenumber, offset=None):
+    data = None
+    with open(gribPath, 'rb') as f:
+        if offset == None:
+            offset = _getMessageOffset(f, messagenumber)
+        if offset != None:
+            f.seek(offset)
+            head = f.read(16)
+            if len(head) == 16 and head[:4] == 'GRIB' and ord(head[7]) == 2:
+                data = head + f.read(struct.unpack('>Q', head[8:16])[0] - 16)
+    if data == None:
+        decodeGribFile(gribPath, cacheDir, [messagenumber])
+        return
+
+    if not path.isdir(cacheDir):
+        try: makedirs(cacheDir)
+        except OSError: pass
+    values = getGridValues(pygrib.fromstring(data)).astype(DECODED_DTYPE)
+    _atomicWrite(cacheDir + '{0:04d}.npy'.format(messagenumber), lambda f: np.save(f, values))
+
+'''
+
+  Function:	getDecodedMessages
+  Purpose:	Return the messages of a cached grib file as DecodedMessage objects.
+		Messages are selected by valid time from the file's message table, and
+		only the selected messages missing from the decoded cache are decoded.
+  Params:
+	gribPath:	The path of the cached grib file
+	validTimes:	Optional set of the valid times of the messages needed. Default
+			is every message in the file
+	lazy:		Decode each message when its values are first read instead of all
+			selected messages up front. Default = False
+
+'''
+def getDecodedMessages(gribPath, validTimes=None, lazy=False):
+    cacheDir = _sharedPath(NDFD_DECODED.format(gribPath))
+    index = cacheDir + NDFD_DECODED_INDEX
+    if not path.isfile(index):
+        with _cacheLock():
+            with FileLock(NDFD_DECODE_LOCK.format(gribPath)):
+                if not path.isfile(index):
+                    indexGribFile(gribPath, cacheDir)
+    with open(index) as f:
+        table = json.load(f)
+    messages = [DecodedMessage(cacheDir, meta, gribPath) for meta in table]
+    if validTimes != None:
+        messages = [m for m in messages if m.validTime in validTimes]
+    if lazy:
+        return messages
+    if any(not path.isfile(m.path) for m in messages):
+        with _cacheLock():
+            with FileLock(NDFD_DECODE_LOCK.format(gribPath)):
+                missing = [m.messagenumber for m in messages if not path.isfile(m.path)]
+                decodeGribFile(gribPath, cacheDir, missing)
+    return messages
+
+'''
+
+  Class:	CubeMessage
+  Purpose:	A single time step of a time series cube. Behaves like a DecodedMessage
+		whose values are a view into the memory-mapped cube.
+  Params:
+	cube:		The memory-mapped cube array
+	index:		The time index of this message in the cube
+	meta:		The message's entry in the cube index
+	pointMajor:	Whether the cube is stored as (y, x, time) instead of (time, y, x)
+
+'''
+class CubeMessage(DecodedMessage):
+    def __init__(self, cube, index, meta, pointMajor, cubeDir=''):
+        DecodedMessage.__init__(self, '', meta)
+        self.cubeDir = cubeDir
+        self.cubeIndex = index
+        if pointMajor:
+            self._values = cube[:, :, index]
+        else:
+            self._values = cube[index]
+
+'''
+
+  Function:	ingestCube
+  Purpose:	Combine every message of a variable in an area for the latest forecast
+		cycle into a single memory-mapped cube ordered by valid time. Once a cube
+		exists, getForecastAnalysis reads from it automatically.
+  Params:
+	var:		The NDFD variable to ingest
+	area:		The NDFD grid area to ingest
+	pointMajor:	Store the cube as (y, x, time) so the time series of each grid
+			point is contiguous on disk. Default = False, (time, y, x)
+
+'''
+def ingestCube(var, area, pointMajor=False):
+    messages = []
+    for g in getVariable(var, area):
+        messages.extend(getDecodedMessages(g))
+    messages.sort(key=lambda m: m.validTime)
+    times = []
+    for m in messages:
+        if len(times) == 0 or times[-1].validTime != m.validTime:
+            times.append(m)
+    if len(times) == 0:
+        raise RuntimeError('No messages available to ingest for ' + var + ' in area ' + area)
+
+    cubeDir = _sharedPath(getCycleDir() + NDFD_CUBE.format(area, var))
+    if not path.isdir(cubeDir):
+        try: makedirs(cubeDir)
+        except OSError: pass
+
+    ny, nx = times[0].values.shape
+    if pointMajor:
+        shape = (ny, nx, len(times))
+    else:
+        shape = (len(times), ny, nx)
+    index = { }
+    index['pointMajor'] = pointMajor
+    index['messages'] = [m.meta for m in times]
+
+    # readers take the lock shared, so they never pair the data of one ingest
+    # with the index of another
+    with _cacheLock():
+        with FileLock(NDFD_DECODE_LOCK.format(cubeDir.rstrip(path.sep))):
+            fd, tmp = mkstemp(dir=cubeDir, prefix='.tmp')
+            close(fd)
+            try:
+                cube = np.lib.format.open_memmap(tmp, mode='w+', dtype=times[0].values.dtype, shape=shape)
+                for i, m in enumerate(times):
+                    if pointMajor:
+                        cube[:, :, i] = m.values
+                    else:
+                        cube[i] = m.values
+                cube.flush()
+                del cube
+                rename(tmp, cubeDir + NDFD_CUBE_DATA)
+                rmtree(_integralDir(cubeDir) + NDFD_CUBE_INTEGRAL, ignore_errors=True)
+            except:
+                try: remove(tmp)
+                except OSError: pass
+                raise
+            _atomicWrite(cubeDir + NDFD_CUBE_INDEX, lambda f: json.dump(index, f))
+    return cubeDir
+
+'''
+
+  Function:	getCubeMessages
+  Purpose:	Return the messages of the ingested cube of a variable in an area for
+		the latest forecast cycle, or None if no cube has been ingested
+  Params:
+	var:	The NDFD variable
+	area:	The NDFD grid area
+
+'''
+def getCubeMessages(var, area):
+    cubeDir = _sharedPath(getCycleDir() + NDFD_CUBE.format(area, var))
+    if not path.isfile(cubeDir + NDFD_CUBE_INDEX):
+        return None
+    with FileLock(NDFD_DECODE_LOCK.format(cubeDir.rstrip(path.sep)), shared=True):
+        with open(cubeDir + NDFD_CUBE_INDEX) as f:
+            index = json.load(f)
+        cube = np.load(cubeDir + NDFD_CUBE_DATA, mmap_mode='r')
+    return [CubeMessage(cube, i, meta, index['pointMajor'], cubeDir) for i, meta in enumerate(index['messages'])]
+
+'''
+
+  Function:	getForecastMessages
+  Purpose:	Return the decoded messages of a variable in an area for the latest
+		forecast cycle, from the ingested cube if there is one, otherwise from
+		the decoded cache of each grib file.
+  Params:
+	var:		The NDFD variable
+	area:		The NDFD grid area
+	minTime:	Optional minimum valid time of the messages needed
+	maxTime:	Optional maximum valid time of the messages needed
+	validTimes:	Optional set of the valid times of the messages needed. Messages
+			at other times are never decoded
+	lazy:		Decode each message when its values are first read. Default = False
+
+'''
+def getForecastMessages(var, area, minTime=None, maxTime=None, validTimes=None, lazy=False):
+    messages = getCubeMessages(var, area)
+    if messages != None:
+        if validTimes != None:
+            messages = [m for m in messages if m.validTime in validTimes]
+        return messages
+    messages = []
+    for g in getVariable(var, area, minTime, maxTime):
+        messages.extend(getDecodedMessages(g, validTimes, lazy))
+    return messages
+
+'''
+
+  Function:	_atomicWrite
+  Purpose:	Write a file through a temporary file in the same directory and
+		rename it into place once complete
+  Params:
+	dest:	The final path of the file
+	write:	Function that writes the contents to the open file object
+
+'''
+def _atomicWrite(dest, write):
+    fd, tmp = mkstemp(dir=path.dirname(dest), prefix='.tmp')
+    try:
+        f = fdopen(fd, 'wb')
+        try: write(f)
+        finally: f.close()
+        rename(tmp, dest)
+    except:
+        try: remove(tmp)
+        except OSError: pass
+        raise
+
+'''
+
+  Function:	getAreaGeometry
+  Purpose:	Return the forecast grid geometry of an NDFD area without needing a
+		grib message at hand. Geometries are looked up in the GRID_GEOMETRY
+		registry, then built from the static grid definition of the area in
+		ndfd_defs, then looked up in the static grids file under NDFD_TMP, and
+		otherwise read from the first message of one of the area's variables,
+		fetched with a range request where the server supports it. Fetched
+		geometries are added to the static grids file so every process only
+		fetches them once.
+  Params:
+	area:	The NDFD grid area
+
+'''
+def getAreaGeometry(area):
+    key = (area, 'forecast')
+    if key in GRID_GEOMETRY:
+        return GRID_GEOMETRY[key]
+
+    grid = DEFS['grids'].get(area, { })
+    if 'projparams' in grid:
+        p = Proj(grid['projparams'])
+        geometry = { }
+        geometry['proj'] = p
+        geometry['projparams'] = grid['projparams']
+        geometry['offsetX'], geometry['offsetY'] = p(grid['lon1'], grid['lat1'])
+        geometry['dx'] = grid['dx']
+        geometry['dy'] = grid['dy']
+        geometry['shape'] = (grid['ny'], grid['nx'])
+        GRID_GEOMETRY[key] = geometry
+        return geometry
+
+    gridsFile = NDFD_TMP + NDFD_STATIC_GRIDS
+    grids = _loadStaticGrids(gridsFile)
+    if area in grids:
+        geometry = dict(grids[area])
+        geometry['shape'] = tuple(geometry['shape'])
+        geometry['proj'] = Proj(geometry['projparams'])
+        GRID_GEOMETRY[key] = geometry
+        return geometry
+
+    if not area in DEFS['vars']:
+        raise ValueError('Invalid Area: ' + str(area))
+    vp = sorted(DEFS['vars'][area])[0]
+    uri, localPath = _getVariableFiles(DEFS['vars'][area][vp][0], area)[0]
+    gribPath = localPath
+    if not path.isfile(localPath) and urlparse(uri).scheme in ('http', 'https'):
+        index = _getMessageIndex(uri, localPath)
+        if index != None and len(index['messages']) > 0:
+            t = datetime.strptime(index['messages'][0]['validTime'], '%Y-%m-%d %H:%M:%S')
+            gribPath = _getVariableMessages(uri, localPath, t, t)[0]
+    if gribPath == localPath:
+        downloadFiles([(uri, localPath)])
+    grbs = pygrib.open(gribPath)
+    geometry = getGridGeometry(grbs.message(1), area)
+    grbs.close()
+
+    if not path.isdir(path.dirname(gridsFile)):
+        try: makedirs(path.dirname(gridsFile))
+        except OSError: pass
+    # other processes add their areas to the same file
+    with _cacheLock():
+        with FileLock(NDFD_LOCK.format(gridsFile)):
+            grids = _loadStaticGrids(gridsFile)
+            grids[area] = dict((k, v) for k, v in geometry.items() if k != 'proj')
+            _atomicWrite(gridsFile, lambda f: json.dump(grids, f))
+    return geometry
+
+def _loadStaticGrids(gridsFile):
+    if not path.isfile(gridsFile):
+        return { }
+    with open(gridsFile) as f:
+        return json.load(f)
+
+'''
+
+  Function:	getAreaFootprints
+  Purpose:	Yield (area, geometry) tuples of the NDFD areas, smallest area first,
+		resolving each geometry only when it is reached. The areas in
+		AREA_FALLBACKS cover the largest extents and come last, in that order.
+  Params:
+	var:	Optional NDFD variable, or list of variables, that the areas must
+		carry. Default is all areas
+
+'''
+def getAreaFootprints(var=None):
+    if var == None:
+        vars = []
+    elif isinstance(var, basestring):
+        vars = [var]
+    else:
+        vars = list(var)
+    fallbacks = [area for area in AREA_FALLBACKS if area in DEFS['grids']]
+    areas = sorted([area for area in DEFS['grids'] if not area in fallbacks], key=lambda a: DEFS['grids'][a]['size'])
+    for area in areas + fallbacks:
+        carried = set()
+        for vp in DEFS['vars'].get(area, { }):
+            carried.update(DEFS['vars'][area][vp])
+        if all(v in carried for v in vars):
+            yield area, getAreaGeometry(area)
+
+'''
+
+  Function:	isInGrid
+  Purpose:	Vectorized test of whether coordinates lie within a grid, meaning their
+		nearest grid point is inside the grid. Return a boolean numpy array.
+  Params:
+	geometry:	The grid geometry to test against
+	lats:		Latitude(s)
+	lons:		Longitude(s)
+
+'''
+def isInGrid(geometry, lats, lons):
+    with np.errstate(invalid='ignore'):
+        gridX, gridY = geometry['proj'](np.asarray(lons, dtype=float), np.asarray(lats, dtype=float))
+        x = (np.asarray(gridX) - geometry['offsetX']) / geometry['dx']
+        y = (np.asarray(gridY) - geometry['offsetY']) / geometry['dy']
+        ny, nx = geometry['shape']
+        return (x >= -0.5) & (x < nx - 0.5) & (y >= -0.5) & (y < ny - 0.5)
+
+'''
+
+  Function:	getSmallestGrid
+  Purpose:	Use the provided lat, lon coordinates to find the smallest
+		NDFD area that contains those coordinates. Return the name of the area.
+  Params:
+	lat:	Latitude, or array of latitudes
+	lon:	Longitude, or array of longitudes
+	var:	Optional NDFD variable, or list of variables, the area must carry
+  Notes:
+	- For arrays, a numpy array of area names is returned, with None for
+	  coordinates outside every area
+	- The footprint of each area is its projected grid extent from its static
+	  grid definition, see getAreaGeometry
+
+'''
+def getSmallestGrid(lat, lon, var=None):
+    lats = np.atleast_1d(np.asarray(lat, dtype=float))
+    lons = np.atleast_1d(np.asarray(lon, dtype=float))
+    areas = np.empty(lats.shape, dtype=object)
+    remaining = np.ones(lats.shape, dtype=bool)
+    for area, geometry in getAreaFootprints(var):
+        inside = np.zeros(lats.shape, dtype=bool)
+        inside[remaining] = isInGrid(geometry, lats[remaining], lons[remaining])
+        areas[inside] = area
+        remaining &= ~inside
+        if not remaining.any():
+            break
+
+    if np.ndim(lat) == 0 and np.ndim(lon) == 0:
+        if areas[0] == None:
+            raise ValueError('Coordinates are not within any NDFD area.')
+        return areas[0]
+    return areas
+
+'''
+
+  Function:	getSmallestCommonGrid
+  Purpose:	Find the smallest NDFD area that contains all of the provided
+		coordinates. Return the name of the area.
+  Params:
+	lats:	Array of latitudes
+	lons:	Array of longitudes
+	var:	Optional NDFD variable, or list of variables, the area must carry
+
+'''
+def getSmallestCommonGrid(lats, lons, var=None):
+    for area, geometry in getAreaFootprints(var):
+        if isInGrid(geometry, lats, lons).all():
+            return area
+    raise ValueError('Coordinates are not all within a single NDFD area.')
+
+'''
+
+  Function:	getGridGeometry
+  Purpose:	Return the geometry of the grid a grib message lies on: the Proj, the
+		projected origin offsets, the grid spacing and the grid shape. Geometries
+		are kept in the GRID_GEOMETRY registry by area and kind, so the projection
+		is built once and reused across messages, files and requests.
+  Params:
+	grb:		The grib message to read the geometry from if it is not registered
+	area:		Optional: The NDFD grid area the message belongs to. If not given
+			  the geometry is built but not registered.
+	kind:		Which grid of the area: 'forecast' or 'elev'. Default = 'forecast'
+	projparams:	Optional: Use to supply different Proj4 parameters than the
+				  supplied grib message uses.
+
+'''
+def getGridGeometry(grb, area=None, kind='forecast', projparams=None):
+    key = (area, kind)
+    if area != None and key in GRID_GEOMETRY:
+        return GRID_GEOMETRY[key]
+
+    if projparams == None:
+        projparams = grb.projparams
+    p = Proj(projparams)
+    geometry = { }
+    geometry['proj'] = p
+    geometry['projparams'] = projparams
+    geometry['offsetX'], geometry['offsetY'] = p(grb['longitudeOfFirstGridPointInDegrees'], grb['latitudeOfFirstGridPointInDegrees'])
+    try:
+        geometry['dx'] = grb['DxInMetres']
+        geometry['dy'] = grb['DyInMetres']
+    except:
+        geometry['dx'] = grb['DiInMetres']
+        geometry['dy'] = grb['DjInMetres']
+    try:
+        geometry['shape'] = (grb['Ny'], grb['Nx'])
+    except:
+        geometry['shape'] = (grb['Nj'], grb['Ni'])
+
+    if area != None:
+        GRID_GEOMETRY[key] = geometry
+    return geometry
+
+'''
+
+  Function:	getGridIndex
+  Purpose:	Find the nearest grid points to coordinates using a grid geometry from
+		getGridGeometry. Accepts scalars or arrays and returns numpy arrays of the
+		indexes as well as the lat/lon and grid coordinates of the grid points.
+  Params:
+	geometry:	The grid geometry to search
+	lats:		Latitude(s)
+	lons:		Longitude(s)
+
+'''
+def getGridIndex(geometry, lats, lons):
+    p = geometry['proj']
+    gridX, gridY = p(np.asarray(lons, dtype=float), np.asarray(lats, dtype=float))
+    x = np.round((gridX - geometry['offsetX']) / geometry['dx']).astype(int)
+    y = np.round((gridY - geometry['offsetY']) / geometry['dy']).astype(int)
+    gLon, gLat = p(x * geometry['dx'] + geometry['offsetX'], y * geometry['dy'] + geometry['offsetY'], inverse=True)
+    return x, y, gridX, gridY, np.asarray(gLat), np.asarray(gLon)
+
+'''
+
+  Function:	getNearestGridPoint
+  Purpose:	Find the nearest grid point to the provided coordinates in the supplied
+		grib message. Return the indexes to the numpy array as well as the
+		lat/lon and grid coordinates of the grid point.
+  Params:
+	grb:		The grib message to search
+	lat:		Latitude
+	lon:		Longitude
+	projparams:	Optional: Use to supply different Proj4 parameters than the
+				  supplied grib message uses.
+	area:		Optional: The NDFD grid area of the message, to use the registered
+			  grid geometry. See getGridGeometry
+	kind:		Optional: Which grid of the area. Default = 'forecast'
+
+'''
+def getNearestGridPoint(grb, lat, lon, projparams=None, area=None, kind='forecast'):
+    geometry = getGridGeometry(grb, area, kind, projparams)
+    x, y, gridX, gridY, gLat, gLon = getGridIndex(geometry, lat, lon)
+    return int(x), int(y), float(gridX), float(gridY), float(gLat), float(gLon)
+
+'''
+
+  Function:	getNearestGridPoints
+  Purpose:	Vectorized version of getNearestGridPoint. Find the nearest grid points to
+		arrays of coordinates using a single projection call. Return numpy arrays
+		of the indexes as well as the lat/lon and grid coordinates of the grid points.
+  Params:
+	grb:		The grib message to search
+	lats:		Array of latitudes
+	lons:		Array of longitudes
+	projparams:	Optional: Use to supply different Proj4 parameters than the
+				  supplied grib message uses.
+	area:		Optional: The NDFD grid area of the message, to use the registered
+			  grid geometry. See getGridGeometry
+	kind:		Optional: Which grid of the area. Default = 'forecast'
+
+'''
+def getNearestGridPoints(grb, lats, lons, projparams=None, area=None, kind='forecast'):
+    geometry = getGridGeometry(grb, area, kind, projparams)
+    return getGridIndex(geometry, lats, lons)
+
+'''
+
+  Function:	getGridValues
+  Purpose:	Decode a grib message once and return its values as a float numpy array
+		with missing (masked) values set to NaN. Reuse the returned array instead
+		of accessing grb.values again, as every access decodes the whole grid.
+  Params:
+	grb:	The grib message to decode
+
+'''
+def getGridValues(grb):
+    if isinstance(grb, DecodedMessage):
+        return grb.values
+    return np.ma.filled(np.ma.asarray(grb.values, dtype=float), np.nan)
+
+'''
+
+  Function:	getGridWindow
+  Purpose:	Slice the neighborhood of n levels around a grid point out of
+		decoded grid values. Raise IndexError if it goes beyond the grid.
+  Params:
+	values:	Decoded grid values as returned by getGridValues
+	x:	The x index of the grid point
+	y:	The y index of the grid point
+	n:	The levels away from the grid point to include
+
+'''
+def getGridWindow(values, x, y, n):
+    if x - n < 0 or y - n < 0 or x + n >= values.shape[1] or y + n >= values.shape[0]:
+        raise IndexError('Window goes beyond the grid')
+    return values[y - n:y + n + 1, x - n:x + n + 1]
+
+'''
+
+  Function:	buildIntegralImages
+  Purpose:	Build the summed-area tables of decoded grid values: the count of valid
+		cells, the sum and the sum of squares. Each is one row and column larger
+		than the grid, so the total over any window comes from four lookups.
+		The sums are of the values less an offset, the mean of the grid, so the
+		sums of squares of windows stay small and the variances taken from them
+		do not cancel. Return the tables and the offset.
+  Params:
+	values:	Decoded grid values as returned by getGridValues
+
+'''
+def buildIntegralImages(values):
+    values = np.ma.filled(np.ma.asarray(values, dtype=float), np.nan)
+    valid = ~np.isnan(values)
+    offset = float(values[valid].mean()) if valid.any() else 0.0
+    filled = np.where(valid, values - offset, 0.0)
+    images = np.zeros((3, values.shape[0] + 1, values.shape[1] + 1))
+    images[0, 1:, 1:] = valid.cumsum(0).cumsum(1)
+    images[1, 1:, 1:] = filled.cumsum(0).cumsum(1)
+    images[2, 1:, 1:] = (filled ** 2).cumsum(0).cumsum(1)
+    return images, offset
+
+'''
+
+  Function:	getIntegralImages
+  Purpose:	Return the summed-area tables of a message and their offset. Those of
+		messages in the decoded cache or in a cube are built once, stored on
+		disk with their offset and memory-mapped. See buildIntegralImages
+  Params:
+	grb:	The grib message
+  Notes:
+	- The tables are three float64 planes of (ny+1)(nx+1) cells, about 71 MB
+	  per CONUS message, so they stay under NDFD_TMP even when decoded grids
+	  are kept in shared memory, see setSharedMemoryDir
+
+'''
+def getIntegralImages(grb):
+    if isinstance(grb, CubeMessage):
+        if grb.cubeDir == '':
+            return buildIntegralImages(getGridValues(grb))
+        integralDir, number = _integralDir(grb.cubeDir) + NDFD_CUBE_INTEGRAL, grb.cubeIndex + 1
+    elif isinstance(grb, DecodedMessage):
+        integralDir, number = _integralDir(grb.cacheDir), grb.messagenumber
+    else:
+        return buildIntegralImages(getGridValues(grb))
+    imagesPath = integralDir + NDFD_INTEGRAL.format(number)
+    offsetPath = integralDir + NDFD_INTEGRAL_OFFSET.format(number)
+    # the offset is written first, so tables without one predate it
+    if not path.isfile(imagesPath) or not path.isfile(offsetPath):
+        if not path.isdir(integralDir):
+            try: makedirs(integralDir)
+            except OSError: pass
+        images, offset = buildIntegralImages(grb.values)
+        _atomicWrite(offsetPath, lambda f: json.dump(offset, f))
+        _atomicWrite(imagesPath, lambda f: np.save(f, images))
+    with open(offsetPath) as f:
+        offset = json.load(f)
+    return np.load(imagesPath, mmap_mode='r'), offset
+
+'''
+
+  Function:	_integralDir
+  Purpose:	Return the directory the summed-area tables of a decoded cache or cube
+		directory are kept in, which is under NDFD_TMP even in shared memory mode
+  Params:
+	cacheDir:	The decoded cache or cube directory
+
+'''
+def _integralDir(cacheDir):
+    if SHARED_MEMORY_DIR != None and cacheDir.startswith(SHARED_MEMORY_DIR):
+        cacheDir = NDFD_TMP + cacheDir[len(SHARED_MEMORY_DIR):]
+    return cacheDir
+
+'''
+
+  Function:	precomputeIntegralImages
+  Purpose:	Build the summed-area tables of every message of variables in areas
+		for the latest forecast cycle ahead of analyses that use them
+  Params:
+	vars:	List of NDFD variables
+	areas:	List of NDFD grid areas
+
+'''
+def precomputeIntegralImages(vars, areas):
+    for area in areas:
+        for var in vars:
+            for g in getVariable(var, area):
+                for grb in getDecodedMessages(g):
+                    getIntegralImages(grb)
+
+'''
+
+  Function:	buildSparseTable
+  Purpose:	Build a two dimensional sparse table of decoded grid values, where level
+		k holds the reduction of the 2^k by 2^k block starting at each cell. Any
+		square window then reduces from four overlapping blocks.
+  Params:
+	values:	Decoded grid values as returned by getGridValues
+	levels:	The highest level to build
+	fn:	The NaN ignoring reduction, np.fmin or np.fmax
+
+'''
+def buildSparseTable(values, levels, fn):
+    table = [values]
+    for k in range(1, levels + 1):
+        h = 2 ** (k - 1)
+        prev = table[-1]
+        rows = fn(prev[:-h, :], prev[h:, :])
+        table.append(fn(rows[:, :-h], rows[:, h:]))
+    return table
+
+'''
+
+  Function:	getWindowSummary
+  Purpose:	Summarize the (2n+1)^2 windows around grid points of a message without
+		walking them. The count of valid cells, the sum and the sum of squared
+		differences from the window mean (m2) come from the summed-area tables,
+		and the min and max, when requested, from a sparse table if that is
+		cheaper than reading the windows. The median, when requested, is read
+		from the windows.
+  Params:
+	grb:	The grib message
+	x:	Array of x indexes of the grid points
+	y:	Array of y indexes of the grid points
+	n:	The levels away from the grid points to include
+	stats:	Optional list of statistics that will be needed. Default is all of them
+	values:	Optional decoded values of the message, if already at hand
+
+'''
+def getWindowSummary(grb, x, y, n, stats=None, values=None):
+    if stats == None:
+        stats = STATISTICS
+    if values is None:
+        values = getGridValues(grb)
+    if (x - n).min() < 0 or (y - n).min() < 0 or (x + n).max() >= values.shape[1] or (y + n).max() >= values.shape[0]:
+        raise IndexError('Window goes beyond the grid')
+    x0, x1, y0, y1 = x - n, x + n + 1, y - n, y + n + 1
+
+    images, offset = getIntegralImages(grb)
+    count, total, sumsq = [image[y1, x1] - image[y0, x1] - image[y1, x0] + image[y0, x0] for image in images]
+    summary = { }
+    summary['count'] = count
+    summary['sum'] = total + offset * count
+    with np.errstate(invalid='ignore', divide='ignore'):
+        summary['m2'] = np.where(count > 0, np.maximum(sumsq - total ** 2 / count, 0), 0.0)
+
+    w = 2 * n + 1
+    extremes = [stat for stat in ['min', 'max', 'median'] if stat in stats]
+    k = int(np.log2(w))
+    if 'median' in extremes or (len(extremes) > 0 and len(x) * w * w <= values.size * (k + 1)):
+        offsetsY, offsetsX = np.meshgrid(np.arange(-n, n + 1), np.arange(-n, n + 1), indexing='ij')
+        windows = values[y[:, None] + offsetsY.ravel()[None, :], x[:, None] + offsetsX.ravel()[None, :]]
+        summary.update(computeStatistics(windows, extremes, axis=1))
+    else:
+        off = w - 2 ** k
+        for stat, fn in [('min', np.fmin), ('max', np.fmax)]:
+            if stat in extremes:
+                level = buildSparseTable(values, k, fn)[k]
+                summary[stat] = fn(fn(level[y0, x0], level[y0, x0 + off]), fn(level[y0 + off, x0], level[y0 + off, x0 + off]))
+    return summary
+
+'''
+
+  Function:	reduceWindowSummary
+  Purpose:	Combine window summaries along an axis, e.g. over time steps. The m2
+		of the combined windows adds the spread of the window means around the
+		combined mean to the m2 of each window.
+  Params:
+	summary:	Dict of summary arrays as returned by getWindowSummary, stacked
+	axis:		The axis to combine along, or None for all of them. Default = None
+
+'''
+def reduceWindowSummary(summary, axis=None):
+    reduced = { }
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for key in summary:
+            if key in ('count', 'sum'):
+                reduced[key] = np.sum(summary[key], axis=axis)
+            elif key == 'm2':
+                count = np.asarray(summary['count'])
+                mean = np.sum(summary['sum'], axis=axis) / np.sum(count, axis=axis)
+                if axis != None:
+                    mean = np.expand_dims(mean, axis)
+                spread = np.where(count > 0, count * (summary['sum'] / count - mean) ** 2, 0.0)
+                reduced[key] = np.sum(summary['m2'] + spread, axis=axis)
+            elif key == 'min':
+                reduced[key] = np.nanmin(summary[key], axis=axis)
+            elif key == 'max':
+                reduced[key] = np.nanmax(summary[key], axis=axis)
+    return reduced
+
+'''
+
+  Function:	getSummaryStatistics
+  Purpose:	Compute the requested statistics from window summaries. The median can
+		only come from a summary of a single window, see getWindowSummary. All
+		statistics, the sum too, are NaN where a window has no valid values.
+  Params:
+	summary:	Dict of summary arrays as returned by getWindowSummary
+	stats:		Optional list of statistics to compute, any of STATISTICS.
+			Default is all of them.
+
+'''
+def getSummaryStatistics(summary, stats=None):
+    if stats == None:
+        stats = STATISTICS
+    results = { }
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = summary['sum'] / summary['count']
+        for stat in stats:
+            if not stat in STATISTICS:
+                raise ValueError('Invalid statistic: ' + str(stat))
+            if stat == 'mean':
+                results[stat] = mean
+            elif stat == 'stdDev':
+                results[stat] = np.sqrt(summary['m2'] / summary['count'])
+            elif stat == 'sum':
+                results[stat] = np.where(summary['count'] > 0, summary['sum'], np.nan)
+            else:
+                results[stat] = summary[stat]
+    return results
+
+'''
+
+  Function:	validateArguments
+  Purpose:	Validate the arguments passed into an analysis function to make sure
+		they will work with each other.
+  Params:
+	var:		The NDFD variable being requested
+	area:		The NDFD grid area being requested
+	timeStep:	The time step to be used in the returned analysis
+	minTime:	The minimum forecast time to analyze
+	maxTime:	The maximum forecast time to analyze
+  Notes:
+	- maxTime is not currently being evaluated
+
+'''
+def validateArguments(var, area, timeStep, minTime, maxTime):
+    if timeStep < 1:
+        raise ValueError('timeStep must be >= 1')
+    #if minTime != None and minTime < getLatestForecastTime():
+    #    raise ValueError('minTime is before the current forecast time.')
+    #if maxTime > ...
+    
+    try:
+        areaVP = DEFS['vars'][area]
+    except IndexError:
+        raise ValueError('Invalid Area.')
+
+    validVar = False
+    for vp in areaVP:
+        if var in areaVP[vp]:
+            validVar = True
+            break
+    if not validVar:
+        raise ValueError('Variable not available in area: ' + area)
+
+'''
+
+  Function:	getValidTimes
+  Purpose:	Return the set of forecast valid times an analysis covers, stepping
+		from 00Z of the forecast cycle's day by timeStep hours
+  Params:
+	forecastTime:	The forecast cycle
+	timeStep:	The time step in hours
+	minTime:	Optional minimum valid time
+	maxTime:	Optional maximum valid time
+
+'''
+def getValidTimes(forecastTime, timeStep, minTime=None, maxTime=None):
+    validTimes = set()
+    for hour in range(0, 250, timeStep):
+        t = forecastTime - timedelta(hours=forecastTime.hour) + timedelta(hours=hour)
+        if minTime != None and t < minTime:
+            continue
+        if maxTime != None and t > maxTime:
+            break
+        validTimes.add(t)
+    return validTimes
+
+'''
+
+  Function:	getForecastAnalysis
+  Purpose:	Analyze a grid point for any NDFD forecast variable in any NDFD grid area.
+		The grid point will be the closest point to the supplied coordinates.
+  Params:
+	var:		The NDFD variable to analyzes
+	lat:		Latitude
+	lon:		Longitude
+	n:		The levels away from the grid point to analyze. Default = 1
+	timeStep:	The time step in hours to use in analyzing forecasts. Default = 1
+	elev:		Boolean that indicates whether to include elevation of the grid points
+			Default = False
+	minTime:	Optional minimum time for the forecast analysis
+	maxTime:	Optional maximum time for the forecast analysis
+	area:		Used to specify a specific NDFD grid area. Default is to find the 
+			smallest grid the supplied coordinates lie in.
+	stats:		Optional list of statistics to compute, any of STATISTICS.
+			Default is all of them.
+	integral:	Boolean that indicates whether to compute window statistics from
+			summed-area tables. The median then has to read every window
+			and is left out unless requested in stats. Default = False
+  Notes:
+	- Statistics ignore missing (masked) grid values
+	- Results are kept per grid cell in the POINT_RESULTS LRU cache until the
+	  latest forecast time advances, so nearby requests skip all grib work
+	- With integral=True, window statistics come from summed-area tables, see
+	  getWindowSummary, so large n costs about the same as n=0
+
+'''
+def getForecastAnalysis(var, lat, lon, n=0, timeStep=1, elev=False, minTime=None, maxTime=None, area=None, stats=None, integral=False):
+    global POINT_RESULTS_CYCLE
+    if n < 0:
+        raise ValueError('n must be >= 0')
+
+    if area == None:
+        area = getSmallestGrid(lat, lon, var)
+    validateArguments(var, area, timeStep, minTime, maxTime)
+
+    analysis = { }
+    analysis['var'] = var
+    analysis['reqLat'] = lat
+    analysis['reqLon'] = lon
+    analysis['n'] = n
+    analysis['forecastTime'] = getLatestForecastTime()
+
+    geometry = getAreaGeometry(area)
+    x, y, gridX, gridY, gLat, gLon = getGridIndex(geometry, lat, lon)
+    x, y = int(x), int(y)
+    ny, nx = geometry['shape']
+    if x - n < 0 or y - n < 0 or x + n >= nx or y + n >= ny:
+        raise ValueError('Given coordinates go beyond the grid. Use different coordinates, a larger area or use a smaller n value.')
+    analysis['gridLat'] = float(gLat)
+    analysis['gridLon'] = float(gLon)
+    analysis['deltaX'] = geometry['dx']
+    analysis['deltaY'] = geometry['dy']
+    analysis['distance'] = G.inv(lon, lat, float(gLon), float(gLat))[-1]
+
+    if POINT_RESULTS_CYCLE != analysis['forecastTime']:
+        POINT_RESULTS.clear()
+        POINT_RESULTS_CYCLE = analysis['forecastTime']
+    key = (var, area, x, y, n, analysis['forecastTime'], timeStep, minTime, maxTime, None if stats == None else tuple(stats), integral)
+    result = POINT_RESULTS.get(key)
+    if result == None:
+        validTimes = getValidTimes(analysis['forecastTime'], timeStep, minTime, maxTime)
+        result = _analyzeGridPoint(var, area, x, y, n, minTime, maxTime, validTimes, stats, integral)
+        POINT_RESULTS.put(key, result)
+
+    for k in result:
+        analysis[k] = result[k]
+    # the cached forecasts are shared with later lookups of the same cell
+    analysis['forecasts'] = dict((t, dict(forecast)) for t, forecast in result['forecasts'].items())
+
+    if elev and len(analysis['forecasts']) > 0:
+        analysis['elevation'] = getElevationAnalysis(area, x, y, n, stats)
+
+    return analysis
+
+'''
+
+  Function:	_analyzeGridPoint
+  Purpose:	Read the forecasts of a variable at a grid cell and its neighborhood,
+		returning the units, the forecasts of each time step and the statistics
+		over all of them. This is the part of getForecastAnalysis that depends
+		only on the grid cell, and is kept in the POINT_RESULTS cache.
+  Params:
+	var:		The NDFD variable to analyze
+	area:		The NDFD grid area
+	x:		The x index of the grid cell
+	y:		The y index of the grid cell
+	n:		The levels away from the grid cell to analyze
+	minTime:	Minimum time for the forecast analysis, or None
+	maxTime:	Maximum time for the forecast analysis, or None
+	validTimes:	The set of valid times to analyze
+	stats:		List of statistics to compute, or None for all of them
+	integral:	Use summed-area tables instead of reading the windows
+
+'''
+def _analyzeGridPoint(var, area, x, y, n, minTime, maxTime, validTimes, stats, integral=False):
+    result = { }
+    result['forecasts'] = { }
+
+    if integral and stats == None:
+        stats = [stat for stat in STATISTICS if stat != 'median']
+
+    times = []
+    windows = []
+    summaries = []
+    # the median of all time steps needs every value
+    needWindows = not integral or 'median' in stats
+    for grb in getForecastMessages(var, area, minTime, maxTime, validTimes):
+        t = grb.validTime
+        if not 'units' in result:
+            result['units'] = grb['parameterUnits']
+        try:
+            values = getGridValues(grb)
+            if integral:
+                summaries.append(getWindowSummary(grb, np.array([x]), np.array([y]), n, stats, values))
+            if needWindows:
+                windows.append(getGridWindow(values, x, y, n).T.ravel())
+            times.append(t)
+            nearestVal = values[y, x]
+        except IndexError:
+            raise ValueError('Given coordinates go beyond the grid. Use different coordinates, a larger area or use a smaller n value.')
+
+        forecast = { }
+        forecast['nearest'] = nearestVal
+        result['forecasts'][t] = forecast
+
+    if len(summaries) > 0:
+        summary = dict((key, np.concatenate([s[key] for s in summaries])) for key in summaries[0])
+        if n > 0:
+            stepStats = getSummaryStatistics(summary, stats)
+            for i, t in enumerate(times):
+                forecast = result['forecasts'][t]
+                forecast['points'] = (2 * n + 1) ** 2
+                for stat in stepStats:
+                    forecast[stat] = float(stepStats[stat][i])
+        overall = getSummaryStatistics(reduceWindowSummary(summary), [stat for stat in stats if stat != 'median'])
+        if needWindows:
+            overall.update(computeStatistics(np.vstack(windows), ['median']))
+        for stat, val in overall.items():
+            result[stat] = float(val)
+        return result
+
+    if len(windows) > 0:
+        windows = np.vstack(windows)
+    else:
+        windows = np.empty((0, (2 * n + 1) ** 2))
+
+    if windows.shape[1] > 1:
+        stepStats = computeStatistics(windows, stats, axis=1)
+        for i, t in enumerate(times):
+            forecast = result['forecasts'][t]
+            forecast['points'] = windows.shape[1]
+            for stat in stepStats:
+                forecast[stat] = float(stepStats[stat][i])
+
+    for stat, val in computeStatistics(windows, stats).items():
+        result[stat] = float(val)
+
+    return result
+
+'''
+
+  Function:	getTerrain
+  Purpose:	Return the static terrain of an NDFD area from the TERRAIN store,
+		loading it once per process and forecast cycle. The store holds the
+		elevation values, memory-mapped from the decoded cache unless TERRAIN_MMAP
+		is False, the terrain grid geometry and the scale and shift that align
+		forecast grid indexes with terrain grid indexes.
+  Params:
+	area:	The NDFD grid area
+
+'''
+def getTerrain(area):
+    forecastTime = getLatestForecastTime()
+    terrain = TERRAIN.get(area)
+    if terrain != None and terrain['forecastTime'] == forecastTime:
+        return terrain
+
+    e = getDecodedMessages(getElevationVariable(area))[0]
+    forecast = getAreaGeometry(area)
+    # the terrain is located with the forecast grid's projection
+    geometry = getGridGeometry(e, area, 'elev', forecast['projparams'])
+    terrain = { }
+    terrain['forecastTime'] = forecastTime
+    terrain['units'] = e['parameterUnits']
+    terrain['values'] = getGridValues(e)
+    if not TERRAIN_MMAP:
+        terrain['values'] = np.array(terrain['values'])
+    terrain['geometry'] = geometry
+    terrain['scaleX'] = forecast['dx'] / geometry['dx']
+    terrain['scaleY'] = forecast['dy'] / geometry['dy']
+    terrain['shiftX'] = (forecast['offsetX'] - geometry['offsetX']) / geometry['dx']
+    terrain['shiftY'] = (forecast['offsetY'] - geometry['offsetY']) / geometry['dy']
+    TERRAIN[area] = terrain
+    return terrain
+
+'''
+
+  Function:	getTerrainIndex
+  Purpose:	Return the terrain grid indexes of forecast grid points of an NDFD area
+  Params:
+	area:	The NDFD grid area
+	x:	The x index, or array of x indexes, of the forecast grid points
+	y:	The y index, or array of y indexes, of the forecast grid points
+
+'''
+def getTerrainIndex(area, x, y):
+    terrain = getTerrain(area)
+    eX = np.round(np.asarray(x) * terrain['scaleX'] + terrain['shiftX']).astype(int)
+    eY = np.round(np.asarray(y) * terrain['scaleY'] + terrain['shiftY']).astype(int)
+    return eX, eY
+
+'''
+
+  Function:	getElevationAnalysis
+  Purpose:	Analyze the elevation of forecast grid points, and of their
+		neighborhoods, from the area's terrain store. Values are floats for a
+		single grid point and numpy arrays for arrays of grid points.
+  Params:
+	area:	The NDFD grid area
+	x:	The x index, or array of x indexes, of the forecast grid points
+	y:	The y index, or array of y indexes, of the forecast grid points
+	n:	The levels away from the grid points to analyze. Default = 0
+	stats:	Optional list of statistics to compute, any of STATISTICS except sum.
+		Default is all of them.
+
+'''
+def getElevationAnalysis(area, x, y, n=0, stats=None):
+    terrain = getTerrain(area)
+    values = terrain['values']
+    single = np.ndim(x) == 0
+    eX, eY = getTerrainIndex(area, np.atleast_1d(x), np.atleast_1d(y))
+    if (eX - n).min() < 0 or (eY - n).min() < 0 or (eX + n).max() >= values.shape[1] or (eY + n).max() >= values.shape[0]:
+        raise ValueError('Given coordinates go beyond the grid. Use different coordinates, a larger area or use a smaller n value.')
+    offsetsY, offsetsX = np.meshgrid(np.arange(-n, n + 1), np.arange(-n, n + 1), indexing='ij')
+    windows = values[eY[:, None] + offsetsY.ravel()[None, :], eX[:, None] + offsetsX.ravel()[None, :]]
+
+    elevation = { }
+    elevation['nearest'] = values[eY, eX]
+    elevation['units'] = terrain['units']
+    if windows.shape[1] > 1:
+        elevation['points'] = windows.shape[1]
+        eStats = [stat for stat in (STATISTICS if stats == None else stats) if stat != 'sum']
+        elevation.update(computeStatistics(windows, eStats, axis=1))
+    if single:
+        for key in elevation:
+            if isinstance(elevation[key], np.ndarray):
+                elevation[key] = float(elevation[key][0])
+    return elevation
+
+'''
+
+  Function:	iterForecastAnalysis
+  Purpose:	Generator version of getForecastAnalysis. Yields (validTime, forecast)
+		for each time step in order, as soon as its message is decoded, so
+		memory use does not grow with the forecast horizon.
+  Params:
+	var:		The NDFD variable to analyze
+	lat:		Latitude
+	lon:		Longitude
+	n:		The levels away from the grid point to analyze. Default = 0
+	timeStep:	The time step in hours to use in analyzing forecasts. Default = 1
+	elev:		Boolean that indicates whether to include elevation of the grid points
+			Default = False
+	minTime:	Optional minimum time for the forecast analysis
+	maxTime:	Optional maximum time for the forecast analysis
+	area:		Used to specify a specific NDFD grid area. Default is to find the
+			smallest grid the supplied coordinates lie in.
+	stats:		Optional list of statistics to compute, any of STATISTICS.
+			Default is all of them.
+	analysis:	Optional dict that is filled with the same keys as getForecastAnalysis,
+			except forecasts. The grid point keys are set with the first time step
+			and the statistics over all time steps once the generator is exhausted.
+  Notes:
+	- Statistics ignore missing (masked) grid values
+	- The median over all time steps is not available, see RunningStatistics
+
+'''
+def iterForecastAnalysis(var, lat, lon, n=0, timeStep=1, elev=False, minTime=None, maxTime=None, area=None, stats=None, analysis=None):
+    if n < 0:
+        raise ValueError('n must be >= 0')
+
+    if area == None:
+        area = getSmallestGrid(lat, lon, var)
+    validateArguments(var, area, timeStep, minTime, maxTime)
+
+    if analysis == None:
+        analysis = { }
+    analysis['var'] = var
+    analysis['reqLat'] = lat
+    analysis['reqLon'] = lon
+    analysis['n'] = n
+    analysis['forecastTime'] = getLatestForecastTime()
+
+    validTimes = getValidTimes(analysis['forecastTime'], timeStep, minTime, maxTime)
+    messages = getForecastMessages(var, area, minTime, maxTime, validTimes, lazy=True)
+    messages.sort(key=lambda m: m.validTime)
+
+    running = RunningStatistics()
+    firstRun = True
+    for grb in messages:
+        t = grb.validTime
+
+        x, y, gridX, gridY, gLat, gLon = getNearestGridPoint(grb, lat, lon, area=area)
+        if firstRun:
+            analysis['gridLat'] = gLat
+            analysis['gridLon'] = gLon
+            analysis['units'] = grb['parameterUnits']
+            try:
+                analysis['deltaX'] = grb['DxInMetres']
+                analysis['deltaY'] = grb['DyInMetres']
+            except:
+                analysis['deltaX'] = grb['DiInMetres']
+                analysis['deltaY'] = grb['DjInMetres']
+            analysis['distance'] = G.inv(lon, lat, gLon, gLat)[-1]
+
+            if elev:
+                analysis['elevation'] = getElevationAnalysis(area, x, y, n, stats)
+            firstRun = False
+
+        try:
+            values = getGridValues(grb)
+            window = getGridWindow(values, x, y, n).T.ravel()
+            nearestVal = values[y, x]
+        except IndexError:
+            raise ValueError('Given coordinates go beyond the grid. Use different coordinates, a larger area or use a smaller n value.')
+
+        forecast = { }
+        forecast['nearest'] = nearestVal
+        if len(window) > 1:
+            forecast['points'] = len(window)
+            for stat, val in computeStatistics(window, stats).items():
+                forecast[stat] = float(val)
+        running.update(window)
+
+        yield t, forecast
 
-    return smallest
+    for stat, val in running.getStatistics(stats).items():
+        analysis[stat] = val
 
 '''
 
-  Function:	getNearestGridPoint
-  Purpose:	Find the nearest grid point to the provided coordinates in the supplied
-		grib message. Return the indexes to the numpy array as well as the
-		lat/lon and grid coordinates of the grid point.
+  Function:	getMultiForecastAnalysis
+  Purpose:	Analyze a grid point for several NDFD forecast variables at once. The
+		area, the arguments and the grid point are resolved once, the variables
+		are fetched and decoded concurrently, and every variable is returned on
+		the same time axis. forecasts holds numpy arrays over times for each
+		variable, with NaN where a variable has no forecast for a time, and
+		statistics holds the statistics of each variable over all times.
   Params:
-	grb:		The grib message to search
+	vars:		List of NDFD variables to analyze
 	lat:		Latitude
 	lon:		Longitude
-	projparams:	Optional: Use to supply different Proj4 parameters than the
-				  supplied grib message uses.
+	n:		The levels away from the grid point to analyze. Default = 0
+	timeStep:	The time step in hours to use in analyzing forecasts. Default = 1
+	minTime:	Optional minimum time for the forecast analysis
+	maxTime:	Optional maximum time for the forecast analysis
+	area:		Used to specify a specific NDFD grid area. Default is to find the
+			smallest grid the supplied coordinates lie in.
+	stats:		Optional list of statistics to compute, any of STATISTICS.
+			Default is all of them.
+  Notes:
+	- Statistics ignore missing (masked) grid values
 
 '''
-def getNearestGridPoint(grb, lat, lon, projparams=None):
-    if projparams == None:
-        p = Proj(grb.projparams)
-    else:
-        p = Proj(projparams)
-    offsetX, offsetY = p(grb['longitudeOfFirstGridPointInDegrees'], grb['latitudeOfFirstGridPointInDegrees'])
-    gridX, gridY = p(lon, lat)
-    try:
-        x = int(round((gridX - offsetX) / grb['DxInMetres']))
-        y = int(round((gridY - offsetY) / grb['DyInMetres']))
-        gLon, gLat = p(x * grb['DxInMetres'] + offsetX, y * grb['DyInMetres'] + offsetY, inverse=True)
-    except:
-        x = int(round((gridX - offsetX) / grb['DiInMetres']))
-        y = int(round((gridY - offsetY) / grb['DjInMetres']))
-        gLon, gLat = p(x * grb['DiInMetres'] + offsetX, y * grb['DjInMetres'] + offsetY, inverse=True)
-    return x, y, gridX, gridY, gLat, gLon
-    
-'''
+def getMultiForecastAnalysis(vars, lat, lon, n=0, timeStep=1, minTime=None, maxTime=None, area=None, stats=None):
+    if n < 0:
+        raise ValueError('n must be >= 0')
 
-  Function:	validateArguments
-  Purpose:	Validate the arguments passed into an analysis function to make sure
-		they will work with each other.
-  Params:
-	var:		The NDFD variable being requested
-	area:		The NDFD grid area being requested
-	timeStep:	The time step to be used in the returned analysis
-	minTime:	The minimum forecast time to analyze
-	maxTime:	The maximum forecast time to analyze
-  Notes:
-	- maxTime is not currently being evaluated
+    if area == None:
+        area = getSmallestGrid(lat, lon, vars)
+    for var in vars:
+        validateArguments(var, area, timeStep, minTime, maxTime)
 
-'''
-def validateArguments(var, area, timeStep, minTime, maxTime):
-    if timeStep < 1:
-        raise ValueError('timeStep must be >= 1')
-    #if minTime != None and minTime < getLatestForecastTime():
-    #    raise ValueError('minTime is before the current forecast time.')
-    #if maxTime > ...
-    
-    try:
-        areaVP = DEFS['vars'][area]
-    except IndexError:
-        raise ValueError('Invalid Area.')
+    analysis = { }
+    analysis['vars'] = list(vars)
+    analysis['area'] = area
+    analysis['reqLat'] = lat
+    analysis['reqLon'] = lon
+    analysis['n'] = n
+    analysis['forecastTime'] = getLatestForecastTime()
 
-    validVar = False
-    for vp in areaVP:
-        if var in areaVP[vp]:
-            validVar = True
-            break
-    if not validVar:
-        raise ValueError('Variable not available in area: ' + area)
+    geometry = getAreaGeometry(area)
+    x, y, gridX, gridY, gLat, gLon = getGridIndex(geometry, lat, lon)
+    x, y = int(x), int(y)
+    ny, nx = geometry['shape']
+    if x - n < 0 or y - n < 0 or x + n >= nx or y + n >= ny:
+        raise ValueError('Given coordinates go beyond the grid. Use different coordinates, a larger area or use a smaller n value.')
+    analysis['gridLat'] = float(gLat)
+    analysis['gridLon'] = float(gLon)
+    analysis['deltaX'] = geometry['dx']
+    analysis['deltaY'] = geometry['dy']
+    analysis['distance'] = G.inv(lon, lat, float(gLon), float(gLat))[-1]
+
+    validTimes = getValidTimes(analysis['forecastTime'], timeStep, minTime, maxTime)
+
+    def analyze(var):
+        windows = { }
+        units = None
+        for grb in getForecastMessages(var, area, minTime, maxTime, validTimes):
+            try:
+                windows[grb.validTime] = getGridWindow(getGridValues(grb), x, y, n).T.ravel()
+            except IndexError:
+                raise ValueError('Given coordinates go beyond the grid. Use different coordinates, a larger area or use a smaller n value.')
+            units = grb['parameterUnits']
+        return windows, units
+
+    if len(vars) > 1:
+        results = _getDecodePool().map(analyze, vars)
+    else:
+        results = [analyze(var) for var in vars]
+
+    times = sorted(set(t for windows, units in results for t in windows))
+    analysis['times'] = times
+    analysis['forecasts'] = { }
+    analysis['statistics'] = { }
+    for var, (windows, units) in zip(vars, results):
+        aligned = np.full((len(times), (2 * n + 1) ** 2), np.nan)
+        for i, t in enumerate(times):
+            if t in windows:
+                aligned[i] = windows[t]
+
+        forecast = { }
+        forecast['units'] = units
+        forecast['nearest'] = aligned[:, aligned.shape[1] // 2]
+        if aligned.shape[1] > 1:
+            forecast['points'] = aligned.shape[1]
+            for stat, val in computeStatistics(aligned, stats, axis=1).items():
+                forecast[stat] = val
+        analysis['forecasts'][var] = forecast
+
+        statistics = { }
+        for stat, val in computeStatistics(aligned, stats).items():
+            statistics[stat] = float(val)
+        analysis['statistics'][var] = statistics
+
+    return analysis
 
 '''
 
-  Function:	getForecastAnalysis
-  Purpose:	Analyze a grid point for any NDFD forecast variable in any NDFD grid area.
-		The grid point will be the closest point to the supplied coordinates.
+  Function:	getForecastAnalysisBatch
+  Purpose:	Analyze many grid points at once for any NDFD forecast variable in one
+		NDFD grid area. Each grib file is opened once, each message is decoded once
+		and all coordinates are projected in a single call. Values are returned as
+		numpy arrays indexed by the position of the coordinates in lats/lons.
   Params:
-	var:		The NDFD variable to analyzes
-	lat:		Latitude
-	lon:		Longitude
-	n:		The levels away from the grid point to analyze. Default = 1
+	var:		The NDFD variable to analyze
+	lats:		Array of latitudes
+	lons:		Array of longitudes
+	n:		The levels away from the grid points to analyze. Default = 0
 	timeStep:	The time step in hours to use in analyzing forecasts. Default = 1
-	elev:		Boolean that indicates whether to include elevation of the grid points
-			Default = False
 	minTime:	Optional minimum time for the forecast analysis
 	maxTime:	Optional maximum time for the forecast analysis
-	area:		Used to specify a specific NDFD grid area. Default is to find the 
-			smallest grid the supplied coordinates lie in.
+	area:		Used to specify a specific NDFD grid area. Default is to find the
+			smallest grid all of the supplied coordinates lie in.
+	stats:		Optional list of statistics to compute, any of STATISTICS.
+			Default is all of them.
+	elev:		Boolean that indicates whether to include elevation of the grid points
+			Default = False
+	integral:	Boolean that indicates whether to compute window statistics from
+			summed-area tables. The median then has to read every window
+			and is left out unless requested in stats. Default = False
+  Notes:
+	- Statistics ignore missing (masked) grid values
+	- With integral=True, window statistics come from summed-area tables, see
+	  getWindowSummary, so large n costs about the same as n=0
 
 '''
-def getForecastAnalysis(var, lat, lon, n=0, timeStep=1, elev=False, minTime=None, maxTime=None, area=None):
+def getForecastAnalysisBatch(var, lats, lons, n=0, timeStep=1, minTime=None, maxTime=None, area=None, stats=None, elev=False, integral=False):
     if n < 0:
         raise ValueError('n must be >= 0')
-    negN = n * -1
+    lats = np.atleast_1d(np.asarray(lats, dtype=float))
+    lons = np.atleast_1d(np.asarray(lons, dtype=float))
+    if lats.shape != lons.shape or lats.ndim != 1:
+        raise ValueError('lats and lons must be one dimensional and the same length')
 
     if area == None:
-        area = getSmallestGrid(lat, lon)
+        area = getSmallestCommonGrid(lats, lons, var)
     validateArguments(var, area, timeStep, minTime, maxTime)
 
     analysis = { }
     analysis['var'] = var
-    analysis['reqLat'] = lat
-    analysis['reqLon'] = lon
+    analysis['area'] = area
+    analysis['reqLats'] = lats
+    analysis['reqLons'] = lons
     analysis['n'] = n
     analysis['forecastTime'] = getLatestForecastTime()
     analysis['forecasts'] = { }
-    
-    validTimes = []
-    for hour in range(0, 250, timeStep):
-        t = analysis['forecastTime'] - timedelta(hours=analysis['forecastTime'].hour) + timedelta(hours=hour)
-        if minTime != None and t < minTime:
-            continue
-        if maxTime != None and t > maxTime:
-            break
-        validTimes.append(t)
-    
-    varGrbs = getVariable(var, area)
-    allVals = []
+
+    validTimes = getValidTimes(analysis['forecastTime'], timeStep, minTime, maxTime)
+
+    offsetsY, offsetsX = np.meshgrid(np.arange(-n, n + 1), np.arange(-n, n + 1), indexing='ij')
+    times = []
+    windows = []
+    summaries = []
+    if integral and stats == None:
+        stats = [stat for stat in STATISTICS if stat != 'median']
+    # the median of all time steps needs every value
+    needWindows = not integral or 'median' in stats
     firstRun = True
-    for g in varGrbs:
-        grbs = pygrib.open(g)
-        for grb in grbs:
-            t = datetime(grb['year'], grb['month'], grb['day'], grb['hour']) + timedelta(hours=grb['forecastTime'])
-            if not t in validTimes:
-                continue
+    for grb in getForecastMessages(var, area, minTime, maxTime, validTimes):
+        t = grb.validTime
 
-            x, y, gridX, gridY, gLat, gLon = getNearestGridPoint(grb, lat, lon)
-            if firstRun:
-                analysis['gridLat'] = gLat
-                analysis['gridLon'] = gLon
-                analysis['units'] = grb['parameterUnits']
-                try: 
-                    analysis['deltaX'] = grb['DxInMetres']
-                    analysis['deltaY'] = grb['DyInMetres']
-                except:
-                    analysis['deltaX'] = grb['DiInMetres']
-                    analysis['deltaY'] = grb['DjInMetres']
-                analysis['distance'] = G.inv(lon, lat, gLon, gLat)[-1]
-                firstRun = False
-            
-            vals = []
-            if elev:
-                eGrbs = pygrib.open(getElevationVariable(area))
-                e = eGrbs[1]
-                eX, eY, eGridX, eGridY, eLat, eLon = getNearestGridPoint(e, lat, lon, projparams=grb.projparams)
-                eVals = []
-            try:
-                if n == 0:
-                    val = grb.values[y][x]
-                    if type(val) == NAN:
-                        val = float('nan')
-                    vals.append(val)
-                    allVals.append(val)
-                    nearestVal = val
-                    if elev:
-                        eVal = e.values[eY][eX]
-                        if type(eVal) == NAN:
-                            eVal = float('nan')
-                        eVals.append(eVal)
-                        eNearestVal = eVal
-                else:
-                    for i in range(min(n, negN), max(n, negN) + 1):
-                        for j in range(min(n, negN), max(n, negN) + 1):
-                            val = grb.values[y + j][x + i]
-                            if type(val) == NAN:
-                                val = float('nan')
-                            vals.append(val)
-                            allVals.append(val)
-                            if i == 0 and j == 0:
-                                nearestVal = val
-                            if elev:
-                                eVal = e.values[eY + j][eX + i]
-                                if type(eVal) == NAN:
-                                    eVal = float('nan')
-                                eVals.append(eVal)
-                                if i == 0 and j == 0:
-                                    eNearestVal = eVal
-            except IndexError:
+        values = getGridValues(grb)
+        if firstRun:
+            x, y, gridX, gridY, gLats, gLons = getNearestGridPoints(grb, lats, lons, area=area)
+            if (x - n).min() < 0 or (y - n).min() < 0 or (x + n).max() >= values.shape[1] or (y + n).max() >= values.shape[0]:
                 raise ValueError('Given coordinates go beyond the grid. Use different coordinates, a larger area or use a smaller n value.')
-            
-            forecast = { }
-            forecast['nearest'] = nearestVal
-            if len(vals) > 1:
-                forecast['points'] = len(vals)
-                forecast['min'] = min(vals)
-                forecast['max'] = max(vals)
-                forecast['mean'] = sum(vals) / len(vals)
-                forecast['median'] = median(vals)
-                forecast['stdDev'] = stdDev(vals)        
-                forecast['sum'] = sum(vals)
+            rows = y[:, None] + offsetsY.ravel()[None, :]
+            cols = x[:, None] + offsetsX.ravel()[None, :]
+            analysis['gridLats'] = gLats
+            analysis['gridLons'] = gLons
+            analysis['units'] = grb['parameterUnits']
+            try:
+                analysis['deltaX'] = grb['DxInMetres']
+                analysis['deltaY'] = grb['DyInMetres']
+            except:
+                analysis['deltaX'] = grb['DiInMetres']
+                analysis['deltaY'] = grb['DjInMetres']
+            analysis['distances'] = np.asarray(G.inv(lons, lats, gLons, gLats)[-1])
+            firstRun = False
+
+        if integral:
+            summaries.append(getWindowSummary(grb, x, y, n, stats, values))
+        if needWindows:
+            windows.append(values[rows, cols])
+        times.append(t)
+
+        forecast = { }
+        forecast['nearest'] = values[y, x]
+        analysis['forecasts'][t] = forecast
+
+    if len(summaries) > 0:
+        summary = dict((key, np.array([s[key] for s in summaries])) for key in summaries[0])
+        if n > 0:
+            stepStats = getSummaryStatistics(summary, stats)
+            for i, t in enumerate(times):
+                forecast = analysis['forecasts'][t]
+                forecast['points'] = (2 * n + 1) ** 2
+                for stat in stepStats:
+                    forecast[stat] = stepStats[stat][i]
+        analysis.update(getSummaryStatistics(reduceWindowSummary(summary, axis=0), [stat for stat in stats if stat != 'median']))
+        if needWindows:
+            windows = np.array(windows)
+            analysis.update(computeStatistics(windows.transpose(1, 0, 2).reshape(len(lats), -1), ['median'], axis=1))
+    else:
+        if len(windows) > 0:
+            windows = np.array(windows)
+        else:
+            windows = np.empty((0, len(lats), (2 * n + 1) ** 2))
 
-            if elev:
-                elevation = { }
-                elevation['nearest'] = eNearestVal
-                elevation['units'] = e['parameterUnits']
-                if len(eVals) > 1:
-                    elevation['points'] = len(eVals)
-                    elevation['min'] = min(eVals)
-                    elevation['max'] = max(eVals)
-                    elevation['mean'] = sum(eVals) / len(eVals)
-                    elevation['median'] = median(eVals)
-                    elevation['stdDev'] = stdDev(eVals)
-                analysis['elevation'] = elevation
-                eGrbs.close()
-                elev = False
-             
-            analysis['forecasts'][t] = forecast
-        grbs.close()
-
-    analysis['min'] = float('nan')
-    analysis['max'] = float('nan')
-    analysis['mean'] = float('nan')
-    analysis['median'] = float('nan')
-    analysis['stdDev'] = float('nan')
-    analysis['sum'] = float('nan')
-
-    if len(allVals) > 0:
-        analysis['min'] = min(allVals)
-        analysis['max'] = max(allVals)
-        analysis['mean'] = sum(allVals) / len(allVals)
-        analysis['median'] = median(allVals)
-        analysis['stdDev'] = stdDev(allVals)
-        analysis['sum'] = sum(allVals)
+        if windows.shape[2] > 1:
+            stepStats = computeStatistics(windows, stats, axis=2)
+            for i, t in enumerate(times):
+                forecast = analysis['forecasts'][t]
+                forecast['points'] = windows.shape[2]
+                for stat in stepStats:
+                    forecast[stat] = stepStats[stat][i]
 
+        analysis.update(computeStatistics(windows.transpose(1, 0, 2).reshape(len(lats), -1), stats, axis=1))
+
+    if elev and len(times) > 0:
+        analysis['elevation'] = getElevationAnalysis(area, x, y, n, stats)
+
+    return analysis
+
+'''
+
+  Function:	getTrajectoryAnalysis
+  Purpose:	Sample an NDFD variable along a route, where every waypoint has its own
+		time. Waypoints are grouped by the messages that cover their times, and
+		only those messages are decoded, each with a single vectorized gather of
+		its waypoints. Return a dict with the sampled values and the valid times
+		they come from, one entry per waypoint.
+  Params:
+	var:		The NDFD variable to sample
+	lats:		Array of waypoint latitudes
+	lons:		Array of waypoint longitudes
+	times:		List of waypoint datetimes
+	area:		Optional: The NDFD grid area to use. Default is the smallest area
+			  containing all of the waypoints
+	interpolate:	Optional: Interpolate linearly in time between the forecast times
+			  before and after each waypoint, instead of taking the nearest
+			  forecast time. Default = False
+  Notes:
+	- Waypoints outside the time range of the forecast are NaN, with a valid
+	  time of None.
+	- With interpolate, the valid times are (before, after) tuples.
+
+'''
+def getTrajectoryAnalysis(var, lats, lons, times, area=None, interpolate=False):
+    lats = np.atleast_1d(np.asarray(lats, dtype=float))
+    lons = np.atleast_1d(np.asarray(lons, dtype=float))
+    times = list(times)
+    if lats.shape != lons.shape or lats.ndim != 1 or len(times) != len(lats):
+        raise ValueError('lats, lons and times must be one dimensional and the same length')
+
+    if area == None:
+        area = getSmallestCommonGrid(lats, lons, var)
+    validateArguments(var, area, 1, None, None)
+
+    analysis = { }
+    analysis['var'] = var
+    analysis['area'] = area
+    analysis['reqLats'] = lats
+    analysis['reqLons'] = lons
+    analysis['reqTimes'] = times
+    analysis['forecastTime'] = getLatestForecastTime()
+    analysis['values'] = np.full(len(lats), np.nan)
+    analysis['validTimes'] = [None] * len(lats)
+
+    geometry = getAreaGeometry(area)
+    x, y, gridX, gridY, gLats, gLons = getGridIndex(geometry, lats, lons)
+    if len(lats) > 0 and (x.min() < 0 or y.min() < 0 or x.max() >= geometry['shape'][1] or y.max() >= geometry['shape'][0]):
+        raise ValueError('Given coordinates go beyond the grid. Use different coordinates or a larger area.')
+    analysis['gridLats'] = gLats
+    analysis['gridLons'] = gLons
+    analysis['distances'] = np.asarray(G.inv(lons, lats, gLons, gLats)[-1])
+    if len(lats) == 0:
+        return analysis
+
+    messages = { }
+    for grb in getForecastMessages(var, area, min(times) - timedelta(days=1), max(times) + timedelta(days=1), lazy=True):
+        messages.setdefault(grb.validTime, grb)
+    validTimes = sorted(messages)
+    if len(validTimes) == 0:
+        return analysis
+    analysis['units'] = messages[validTimes[0]]['parameterUnits']
+
+    # the forecast times before and after each waypoint, and the weight of the latter
+    hours = np.array([(t - validTimes[0]).total_seconds() / 3600.0 for t in times])
+    stepHours = np.array([(t - validTimes[0]).total_seconds() / 3600.0 for t in validTimes])
+    covered = (hours >= 0) & (hours <= stepHours[-1])
+    after = np.clip(np.searchsorted(stepHours, hours, side='left'), 0, len(validTimes) - 1)
+    before = np.clip(np.searchsorted(stepHours, hours, side='right') - 1, 0, len(validTimes) - 1)
+    span = stepHours[after] - stepHours[before]
+    weights = np.where(span > 0, (hours - stepHours[before]) / np.where(span > 0, span, 1), 0.0)
+    if not interpolate:
+        before = np.where(weights > 0.5, after, before)
+        weights = np.zeros(len(lats))
+
+    values = np.zeros(len(lats))
+    for i in np.unique(np.concatenate([before[covered], after[covered & (weights > 0)]])):
+        grid = getGridValues(messages[validTimes[i]])
+        for steps, w in [(before, 1 - weights), (after, weights)]:
+            sel = np.flatnonzero(covered & (steps == i) & (w > 0))
+            values[sel] += w[sel] * grid[y[sel], x[sel]]
+
+    analysis['values'] = np.where(covered, values, np.nan)
+    for j in np.flatnonzero(covered):
+        if interpolate:
+            analysis['validTimes'][j] = (validTimes[before[j]], validTimes[after[j]])
+        else:
+            analysis['validTimes'][j] = validTimes[before[j]]
     return analysis
 
 '''
@@ -457,26 +2892,28 @@ def getForecastAnalysis(var, lat, lon, n=0, timeStep=1, elev=False, minTime=None
   Function:	unpackString
   Purpose:	To unpack the packed binary string in the local use section of NDFD gribs
   Params:
-	raw:	The raw byte string containing the packed data
+	raw:	The raw byte string, buffer or memoryview containing the packed data
+  Notes:
+	- The data is a leading pad bit followed by 7 bit characters. The bits are
+	  unpacked with numpy directly from the buffer, and a zero bit is put in
+	  front of each 7 bit group so they can be packed back into bytes.
+	- Input too short to hold a character returns an empty list.
 '''
 
 def unpackString(raw):
-    num_bytes, remainder = divmod(len(raw) * 8 - 1, 7)
-
-    i = int(raw.encode('hex'), 16)
-    if remainder:
-        i >>= remainder
-
-    msg = []
-    for _ in range(num_bytes):
-        byte = i & 127
-        if not byte:
-            msg.append(ord("\n"))
-        elif 32 <= byte <= 126:
-            msg.append(byte)
-        i >>= 7
-    msg.reverse()
-    msg = b"".join(chr(c) for c in msg)
+    if isinstance(raw, memoryview):
+        # numpy only reads the old style buffer interface, which memoryview lacks
+        raw = raw.tobytes()
+    data = np.frombuffer(raw, dtype=np.uint8)
+    numBytes = (len(data) * 8 - 1) // 7
+    if numBytes <= 0:
+        return []
+
+    bits = np.unpackbits(data)[1:numBytes * 7 + 1].reshape(numBytes, 7)
+    chars = np.packbits(np.hstack((np.zeros((numBytes, 1), dtype=np.uint8), bits)), axis=1).ravel()
+    chars = chars[(chars == 0) | ((chars >= 32) & (chars <= 126))]
+    chars[chars == 0] = ord('\n')
+    msg = chars.tostring()
 
     codes = []
     for line in msg.splitlines():
@@ -485,6 +2922,139 @@ def unpackString(raw):
 
     return codes
 
+'''
+
+  Function:	_getMessageOffset
+  Purpose:	Return the byte offset of a message in a grib file by walking the
+		section 0 headers, for decoded caches written without message offsets.
+  Params:
+	f:		The open grib file
+	messagenumber:	The number of the message in the file
+
+'''
+def _getMessageOffset(f, messagenumber):
+    offset = 0
+    for i in range(messagenumber - 1):
+        f.seek(offset)
+        head = f.read(16)
+        if len(head) < 16 or head[:4] != 'GRIB':
+            return None
+        offset += struct.unpack('>Q', head[8:16])[0]
+    return offset
+
+'''
+
+  Function:	readLocalUseSection
+  Purpose:	Read the raw local use section (section 2) of a single grib2 message
+		straight from the file, without decoding the rest of the message. Returns
+		None if the message has no local use section.
+  Params:
+	gribPath:	The path of the grib file
+	messagenumber:	The number of the message in the file
+	offset:		Optional byte offset of the message in the file. Found by walking
+			the file's message headers if not given
+
+'''
+def readLocalUseSection(gribPath, messagenumber, offset=None):
+    with open(gribPath, 'rb') as f:
+        if offset == None:
+            offset = _getMessageOffset(f, messagenumber)
+            if offset == None:
+                return None
+        f.seek(offset)
+        head = f.read(16)
+        if len(head) < 16 or head[:4] != 'GRIB':
+            raise RuntimeError('No grib message at offset ' + str(offset) + ' of ' + gribPath)
+        length = struct.unpack('>Q', head[8:16])[0]
+
+        # section 2 is optional and can only follow section 1
+        pos = offset + 16
+        while pos < offset + length - 4:
+            f.seek(pos)
+            secHead = f.read(5)
+            if len(secHead) < 5:
+                break
+            secLen, secNum = struct.unpack('>IB', secHead)
+            if secNum == 2:
+                return f.read(secLen - 5)
+            if secNum > 2 or secLen == 0:
+                break
+            pos += secLen
+    return None
+
+'''
+
+  Function:	getMessageDigest
+  Purpose:	Return the SHA-1 of the grid, data representation, bitmap and data
+		sections of a grib2 message, read straight from the file. Sections that
+		change with every cycle (identification, local use and product definition)
+		are left out, so a forecast that did not change between cycles keeps its
+		digest.
+  Params:
+	gribPath:	The path of the grib file
+	messagenumber:	The number of the message in the file
+	offset:		Optional byte offset of the message in the file
+
+'''
+def getMessageDigest(gribPath, messagenumber, offset=None):
+    sha = hashlib.sha1()
+    with open(gribPath, 'rb') as f:
+        if offset == None:
+            offset = _getMessageOffset(f, messagenumber)
+        if offset != None:
+            f.seek(offset)
+            head = f.read(16)
+        if offset == None or len(head) < 16 or head[:4] != 'GRIB':
+            raise RuntimeError('No grib message ' + str(messagenumber) + ' in ' + gribPath)
+        length = struct.unpack('>Q', head[8:16])[0]
+
+        pos = offset + 16
+        while pos < offset + length - 4:
+            f.seek(pos)
+            secHead = f.read(5)
+            if len(secHead) < 5:
+                break
+            secLen, secNum = struct.unpack('>IB', secHead)
+            if secLen == 0:
+                break
+            if not secNum in (1, 2, 4):
+                sha.update(secHead)
+                remaining = secLen - 5
+                while remaining > 0:
+                    chunk = f.read(min(DOWNLOAD_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    sha.update(chunk)
+                    remaining -= len(chunk)
+            pos += secLen
+    return sha.hexdigest()
+
+'''
+
+  Function:	getCodeTable
+  Purpose:	Return the decoded wx/wwa code table of a message from the local use
+		section of an NDFD grib file, or None if the message has none. Only the
+		local use section of the requested message is read, and tables are kept
+		in the CODE_TABLES LRU cache by file, cycle and message.
+  Params:
+	gribPath:	The path of the wx or wwa grib file
+	messagenumber:	The number of the message in the file
+	forecastTime:	Optional forecast cycle of the file. Default is the latest forecast time
+	offset:		Optional byte offset of the message in the file
+
+'''
+def getCodeTable(gribPath, messagenumber, forecastTime=None, offset=None):
+    if forecastTime == None:
+        forecastTime = getLatestForecastTime()
+    key = (gribPath, forecastTime, messagenumber)
+    if not key in CODE_TABLES:
+        codes = None
+        raw = readLocalUseSection(gribPath, messagenumber, offset)
+        if raw != None:
+            codes = unpackString(raw)
+        CODE_TABLES.put(key, codes)
+    return CODE_TABLES.get(key)
+
 '''
 
   Function:	parseWeatherString
@@ -493,9 +3063,17 @@ def unpackString(raw):
 	wxString:	The weather string to translate into English
   Notes:
 	- See http://graphical.weather.gov/docs/grib_design.html for details
+	- Results are kept in the PARSED_WEATHER_STRINGS LRU cache
 
 '''
 def parseWeatherString(wxString):
+    parsed = PARSED_WEATHER_STRINGS.get(wxString)
+    if parsed == None:
+        parsed = _parseWeatherString(wxString)
+        PARSED_WEATHER_STRINGS.put(wxString, parsed)
+    return parsed
+
+def _parseWeatherString(wxString):
     weatherString = ''
     visibility = float('nan')
 
@@ -593,9 +3171,17 @@ def parseWeatherString(wxString):
 	wwaString:	The Watch, Warning, Advisory string to translate to English
   Notes:
 	- See http://graphical.weather.gov/docs/grib_design.html for details
+	- Results are kept in the PARSED_ADVISORY_STRINGS LRU cache
 
 '''
 def parseAdvisoryString(wwaString):
+    parsed = PARSED_ADVISORY_STRINGS.get(wwaString)
+    if parsed == None:
+        parsed = _parseAdvisoryString(wwaString)
+        PARSED_ADVISORY_STRINGS.put(wwaString, parsed)
+    return parsed
+
+def _parseAdvisoryString(wwaString):
     advisoryString = ''
 
     words = wwaString.split('^')
@@ -626,46 +3212,56 @@ def parseAdvisoryString(wwaString):
 
 '''
 
-  Function:	getWeatherAnalysis
-  Purpose:	To get an English representation of the current weather and any NWS
-		watch, warning, advisories in effect
+  Function:	iterWeatherAnalysis
+  Purpose:	Generator version of getWeatherAnalysis. Yields (validTime, forecast)
+		for each time step in order, as soon as its wx and wwa messages are
+		decoded.
+  Params:
+	lat:		Latitude
+	lon:		Longitude
+	timeStep:	The time step in hours to use in analyzing forecasts. Default = 1
+	minTime:	Optional minimum time for the forecast analysis
+	maxTime:	Optional maximum time for the forecast analysis
+	area:		Used to specify a specific NDFD grid area. Default is to find the
+			smallest grid the supplied coordinates lie in.
+	analysis:	Optional dict that is filled with the same keys as getWeatherAnalysis,
+			except forecasts, once the first time step is read
 
 '''
-def getWeatherAnalysis(lat, lon, timeStep=1, minTime=None, maxTime=None, area=None):
+def iterWeatherAnalysis(lat, lon, timeStep=1, minTime=None, maxTime=None, area=None, analysis=None):
     if area == None:
-        area = getSmallestGrid(lat, lon)
+        area = getSmallestGrid(lat, lon, ['wx', 'wwa'])
     validateArguments('wx', area, timeStep, minTime, maxTime)
 
-    analysis = { }
+    if analysis == None:
+        analysis = { }
     analysis['reqLat'] = lat
     analysis['reqLon'] = lon
     analysis['forecastTime'] = getLatestForecastTime()
-    analysis['forecasts'] = { }
 
-    validTimes = []
-    for hour in range(0, 250, timeStep):
-        t = analysis['forecastTime'] - timedelta(hours=analysis['forecastTime'].hour) + timedelta(hours=hour)
-        if minTime != None and t < minTime:
-            continue
-        if maxTime != None and t > maxTime:
-            break
-        validTimes.append(t)
+    validTimes = getValidTimes(analysis['forecastTime'], timeStep, minTime, maxTime)
+
+    messages = { }
+    for var in ['wx', 'wwa']:
+        for g in getVariable(var, area, minTime, maxTime):
+            for grb in getDecodedMessages(g, validTimes, lazy=True):
+                messages.setdefault(grb.validTime, { })[var] = (g, grb)
 
-    wxGrbs = getVariable('wx', area)
     firstRun = True
-    for g in wxGrbs:
-        grbs = pygrib.open(g)
-        ncepgrbs = ncepgrib(g)
-        for grb in grbs:
-            t = datetime(grb['year'], grb['month'], grb['day'], grb['hour']) + timedelta(hours=grb['forecastTime'])
-            if not t in validTimes:
+    for t in sorted(messages):
+        forecast = { }
+        forecast['wxString'] = None
+        forecast['weatherString'] = None
+        forecast['visibility'] = float('nan')
+        forecast['wwaString'] = None
+        forecast['advisoryString'] = None
+
+        for var in ['wx', 'wwa']:
+            if not var in messages[t]:
                 continue
-            
-            ncepgrb = ncepgrbs[grb.messagenumber - 1]
-            if not ncepgrb.has_local_use_section:
-                raise RuntimeError('Unable to read wx definitions from grib. Is it not a wx grib file??')
-            
-            x, y, gridX, gridY, gLat, gLon = getNearestGridPoint(grb, lat, lon)
+            g, grb = messages[t][var]
+
+            x, y, gridX, gridY, gLat, gLon = getNearestGridPoint(grb, lat, lon, area=area)
             if firstRun:
                 analysis['gridLat'] = gLat
                 analysis['gridLon'] = gLon
@@ -683,56 +3279,419 @@ def getWeatherAnalysis(lat, lon, timeStep=1, minTime=None, maxTime=None, area=No
             except IndexError:
                 raise ValueError('Coordinates outside the given area.')
 
-            forecast = { }
-            forecast['wxString'] = None
-            forecast['weatherString'] = None
-            forecast['visibility'] = float('nan')
-            forecast['wwaString'] = None
-            forecast['advisoryString'] = None
-
-            if val != grb['missingValue']:
-                defs = unpackString(ncepgrb._local_use_section)
+            if isnan(val) or val == grb['missingValue']:
+                continue
+            defs = getCodeTable(g, grb.messagenumber, analysis['forecastTime'], grb.meta['keys'].get('offset'))
+            if defs == None:
+                raise RuntimeError('Unable to read ' + var + ' definitions from grib. Is it not a ' + var + ' grib file??')
+            if var == 'wx':
                 forecast['wxString'] = defs[int(val)]
                 forecast['weatherString'], forecast['visibility'] = parseWeatherString(forecast['wxString'])
-            
-            analysis['forecasts'][t] = forecast
-        grbs.close()
-
-    wwaGrbs = getVariable('wwa', area)
-    for g in wwaGrbs:
-        grbs = pygrib.open(g)
-        ncepgrbs = ncepgrib(g)
-        for grb in grbs:
-            t = datetime(grb['year'], grb['month'], grb['day'], grb['hour']) + timedelta(hours=grb['forecastTime'])
-            if not t in validTimes:
-                continue
-            
-            ncepgrb = ncepgrbs[grb.messagenumber - 1]
-            if not ncepgrb.has_local_use_section:
-                raise RuntimeError('Unable to read wwa definitions from grib. Is it not a wwa grib file??')
-
-            x, y, gridX, gridY, gLat, gLon = getNearestGridPoint(grb, lat, lon)
-            try:
-                val = grb.values[y][x]
-            except IndexError:
-                raise ValueError('Coordinates outside given area.')
-
-            if not t in analysis['forecasts']:
-                forecast = { }
-                forecast['wxString'] = None
-                forecast['weatherString'] = None
-                forecast['visibility'] = float('nan')
-                forecast['wwaString'] = None
-                forecast['advisoryString'] = None
             else:
-                forecast = analysis['forecasts'][t]
-            
-            if val != grb['missingValue']:
-                defs = unpackString(ncepgrb._local_use_section)
                 forecast['wwaString'] = defs[int(val)]
                 forecast['advisoryString'] = parseAdvisoryString(forecast['wwaString'])
 
-            analysis['forecasts'][t] = forecast
-        grbs.close()
+        yield t, forecast
+
+'''
+
+  Function:	getWeatherAnalysis
+  Purpose:	To get an English representation of the current weather and any NWS
+		watch, warning, advisories in effect
+
+'''
+def getWeatherAnalysis(lat, lon, timeStep=1, minTime=None, maxTime=None, area=None):
+    analysis = { }
+    forecasts = { }
+    for t, forecast in iterWeatherAnalysis(lat, lon, timeStep, minTime, maxTime, area, analysis):
+        forecasts[t] = forecast
+    analysis['forecasts'] = forecasts
+    return analysis
+
+'''
+
+  Function:	parseThreshold
+  Purpose:	Parse a threshold expression into a list of (operator, value) conditions.
+		An expression is one or more comparisons joined by &, e.g. '> 20' or
+		'>= 0.25 & < 1', where the operators are the keys of SCAN_OPERATORS.
+  Params:
+	expression:	The threshold expression
+
+'''
+def parseThreshold(expression):
+    conditions = []
+    for part in expression.split('&'):
+        match = re.match(r'^\s*(>=|<=|==|!=|>|<)\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*$', part)
+        if match == None:
+            raise ValueError('Invalid threshold expression: ' + str(expression))
+        conditions.append((match.group(1), float(match.group(2))))
+    return conditions
+
+'''
+
+  Function:	getThresholdCells
+  Purpose:	Return the flat indexes of the grid cells whose values meet every
+		condition of a parsed threshold expression. Missing (NaN) values never
+		meet an expression, not even one with '!='.
+  Params:
+	values:		Decoded grid values as returned by getGridValues
+	conditions:	List of (operator, value) conditions, see parseThreshold
+
+'''
+def getThresholdCells(values, conditions):
+    mask = ~np.isnan(values)
+    with np.errstate(invalid='ignore'):
+        for op, threshold in conditions:
+            mask &= SCAN_OPERATORS[op](values, threshold)
+    return np.flatnonzero(mask)
+
+'''
+
+  Function:	getRegionLabels
+  Purpose:	Label grid cells with the region of cells connected through any of their
+		eight neighbors they belong to. The cells are split into runs along each
+		row, runs that touch in neighboring rows are linked, and the links are
+		merged by propagating the smallest label with pointer jumping, all with
+		array operations. Return an array of region numbers aligned with cells.
+  Params:
+	cells:	Sorted array of flat indexes of the cells
+	shape:	The (ny, nx) shape of the grid
+
+'''
+def getRegionLabels(cells, shape):
+    ny, nx = shape
+    if len(cells) == 0:
+        return np.empty(0, dtype=int)
+    y, x = np.divmod(cells, nx)
+
+    # runs of consecutive cells along a row, with inclusive start and end columns
+    newRun = np.ones(len(cells), dtype=bool)
+    newRun[1:] = (y[1:] != y[:-1]) | (x[1:] != x[:-1] + 1)
+    runStarts = np.flatnonzero(newRun)
+    runEnds = np.append(runStarts[1:], len(cells)) - 1
+    runRows = y[runStarts]
+    startCols = x[runStarts]
+    endCols = x[runEnds]
+
+    # runs of the next row overlapping a run, diagonals included, form a contiguous block
+    width = nx + 2
+    startKeys = runRows * width + startCols
+    endKeys = runRows * width + endCols
+    lo = np.searchsorted(endKeys, (runRows + 1) * width + startCols - 1, side='left')
+    hi = np.searchsorted(startKeys, (runRows + 1) * width + endCols + 1, side='right')
+    linkCounts = np.maximum(hi - lo, 0)
+    a = np.repeat(np.arange(len(runStarts)), linkCounts)
+    b = lo[a] + np.arange(len(a)) - np.repeat(np.cumsum(linkCounts) - linkCounts, linkCounts)
+
+    labels = np.arange(len(runStarts))
+    while True:
+        merged = labels.copy()
+        np.minimum.at(merged, labels[a], labels[b])
+        np.minimum.at(merged, labels[b], labels[a])
+        merged = merged[merged]
+        while True:
+            jumped = merged[merged]
+            if np.array_equal(jumped, merged):
+                break
+            merged = jumped
+        merged = merged[labels]
+        if np.array_equal(merged, labels):
+            break
+        labels = merged
+
+    runLabels = np.unique(labels, return_inverse=True)[1]
+    return np.repeat(runLabels, runEnds - runStarts + 1)
+
+'''
+
+  Function:	scanGrid
+  Purpose:	Find every grid cell of an NDFD variable in an area that meets a
+		threshold expression at any forecast time of the latest cycle. Each
+		message is evaluated vectorized over the whole grid, and the matching
+		cells are kept in the SCAN_RESULTS LRU cache by message digest, so a new
+		cycle only rescans the messages whose forecasts changed. Return the
+		matching cells with their first exceedance times, the connected regions
+		they form and the number of matching cells at each time.
+  Params:
+	var:		The NDFD variable to scan
+	area:		The NDFD grid area to scan
+	expression:	The threshold expression, in the variable's grib units. See
+			parseThreshold
+	minTime:	Optional minimum time to scan
+	maxTime:	Optional maximum time to scan
+
+'''
+def scanGrid(var, area, expression, minTime=None, maxTime=None):
+    conditions = parseThreshold(expression)
+    validateArguments(var, area, 1, minTime, maxTime)
+
+    scan = { }
+    scan['var'] = var
+    scan['area'] = area
+    scan['expression'] = expression
+    scan['forecastTime'] = getLatestForecastTime()
+    scan['counts'] = { }
+    scan['rescanned'] = 0
+
+    matches = []
+    for g in getVariable(var, area, minTime, maxTime):
+        for grb in getDecodedMessages(g, lazy=True):
+            t = grb.validTime
+            if (minTime != None and t < minTime) or (maxTime != None and t > maxTime):
+                continue
+            digest = getMessageDigest(g, grb.messagenumber, grb.meta['keys'].get('offset'))
+            key = (var, area, t, digest, tuple(conditions))
+            cells = SCAN_RESULTS.get(key)
+            if cells is None:
+                cells = getThresholdCells(getGridValues(grb), conditions)
+                SCAN_RESULTS.put(key, cells)
+                scan['rescanned'] += 1
+            matches.append((t, cells))
+            scan['counts'][t] = scan['counts'].get(t, 0) + len(cells)
+
+    geometry = getAreaGeometry(area)
+    ny, nx = geometry['shape']
+    matches.sort(key=lambda match: match[0])
+    times = [t for t, cells in matches]
+    first = np.full(ny * nx, -1, dtype=int)
+    for i, (t, cells) in enumerate(matches):
+        cells = cells[first[cells] < 0]
+        first[cells] = i
+
+    cells = np.flatnonzero(first >= 0)
+    y, x = np.divmod(cells, nx)
+    lons, lats = geometry['proj'](x * geometry['dx'] + geometry['offsetX'], y * geometry['dy'] + geometry['offsetY'], inverse=True)
+    scan['y'] = y
+    scan['x'] = x
+    scan['lats'] = np.asarray(lats)
+    scan['lons'] = np.asarray(lons)
+    scan['firstTimes'] = list(np.array(times + [None], dtype=object)[first[cells]])
+
+    scan['regions'] = []
+    labels = getRegionLabels(cells, (ny, nx))
+    if len(labels) > 0:
+        sizes = np.bincount(labels)
+        firstTimes = np.full(len(sizes), len(times))
+        np.minimum.at(firstTimes, labels, first[cells])
+        centerLats = np.bincount(labels, scan['lats']) / sizes
+        centerLons = np.bincount(labels, scan['lons']) / sizes
+        order = np.argsort(labels, kind='mergesort')
+        bounds = np.cumsum(sizes)[:-1]
+        for i, (regionY, regionX) in enumerate(zip(np.split(y[order], bounds), np.split(x[order], bounds))):
+            region = { }
+            region['size'] = int(sizes[i])
+            region['y'] = regionY
+            region['x'] = regionX
+            region['firstTime'] = times[firstTimes[i]]
+            region['lat'] = float(centerLats[i])
+            region['lon'] = float(centerLons[i])
+            scan['regions'].append(region)
+    scan['regions'].sort(key=lambda region: (region['firstTime'], -region['size']))
+
+    return scan
+
+'''
+
+  Function:	rasterizePolygons
+  Purpose:	Find the grid cells of an area whose centers fall inside each polygon.
+		The vertices are projected into grid index space and every row of cell
+		centers is filled between the polygon edges crossing it, for all
+		polygons' edges at once. A polygon smaller than a cell gets the cell
+		nearest its vertices' center. Return the flat indexes of the cells and
+		the index of the polygon each one belongs to, as two numpy arrays.
+  Params:
+	area:		The NDFD grid area
+	polygons:	List of polygons. A polygon is a sequence of (lat, lon) vertices,
+			or a list of such rings for polygons with several parts or holes,
+			which are combined with the even-odd rule.
+
+'''
+def rasterizePolygons(area, polygons):
+    geometry = getAreaGeometry(area)
+    ny, nx = geometry['shape']
+    p = geometry['proj']
+
+    edges = []
+    centers = []
+    for i, polygon in enumerate(polygons):
+        if len(polygon) == 0:
+            raise ValueError('Polygon ' + str(i) + ' has no vertices')
+        if np.asarray(polygon[0], dtype=float).ndim == 1:
+            polygon = [polygon]
+        points = []
+        for ring in polygon:
+            ring = np.asarray(ring, dtype=float)
+            if ring.ndim != 2 or ring.shape[1] != 2:
+                raise ValueError('Polygon ' + str(i) + ' is not a sequence of (lat, lon) vertices')
+            gridX, gridY = p(ring[:, 1], ring[:, 0])
+            x = (np.asarray(gridX) - geometry['offsetX']) / geometry['dx']
+            y = (np.asarray(gridY) - geometry['offsetY']) / geometry['dy']
+            edges.append(np.column_stack([np.full(len(x), i), np.roll(x, 1), np.roll(y, 1), x, y]))
+            points.append((x, y))
+        centers.append((np.mean(np.concatenate([x for x, y in points])), np.mean(np.concatenate([y for x, y in points]))))
+    if len(edges) == 0:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+    polygonIds, x0, y0, x1, y1 = np.concatenate(edges).T
+
+    # an edge crosses the rows of cell centers from its lower end up to, but not
+    # including, its upper end, so every ring crosses each row an even number of times
+    first = np.clip(np.ceil(np.minimum(y0, y1)), 0, ny).astype(int)
+    rowCounts = np.maximum(np.clip(np.ceil(np.maximum(y0, y1)), 0, ny).astype(int) - first, 0)
+    edge = np.repeat(np.arange(len(x0)), rowCounts)
+    rows = first[edge] + np.arange(len(edge)) - np.repeat(np.cumsum(rowCounts) - rowCounts, rowCounts)
+    crossings = x0[edge] + (rows - y0[edge]) * (x1[edge] - x0[edge]) / (y1[edge] - y0[edge])
+    ids = polygonIds[edge].astype(int)
+
+    # cells between each pair of consecutive crossings in a row are inside
+    order = np.lexsort((crossings, rows, ids))
+    ids, rows, crossings = ids[order], rows[order], crossings[order]
+    spanIds, spanRows = ids[0::2], rows[0::2]
+    spanStarts = np.maximum(np.ceil(crossings[0::2]).astype(int), 0)
+    spanEnds = np.minimum(np.ceil(crossings[1::2]).astype(int), nx)
+    keep = spanEnds > spanStarts
+    spanIds, spanRows, spanStarts, spanEnds = spanIds[keep], spanRows[keep], spanStarts[keep], spanEnds[keep]
+    spanCounts = spanEnds - spanStarts
+    span = np.repeat(np.arange(len(spanIds)), spanCounts)
+    cells = spanRows[span] * nx + spanStarts[span] + np.arange(len(span)) - np.repeat(np.cumsum(spanCounts) - spanCounts, spanCounts)
+    ids = spanIds[span]
+
+    missing = np.setdiff1d(np.arange(len(polygons)), ids)
+    if len(missing) > 0:
+        x = np.round([centers[i][0] for i in missing]).astype(int)
+        y = np.round([centers[i][1] for i in missing]).astype(int)
+        inGrid = (x >= 0) & (x < nx) & (y >= 0) & (y < ny)
+        cells = np.concatenate([cells, y[inGrid] * nx + x[inGrid]])
+        ids = np.concatenate([ids, missing[inGrid]])
+    return cells, ids
+
+'''
+
+  Function:	getPolygonMasks
+  Purpose:	Return the rasterized cells of polygons on an area's grid, see
+		rasterizePolygons. Masks are kept in the POLYGON_MASKS LRU cache and in the
+		local cache directory by a digest of the polygons and the grid geometry,
+		so each set of polygons is only rasterized once per grid.
+  Params:
+	area:		The NDFD grid area
+	polygons:	List of polygons, see rasterizePolygons
+
+'''
+def getPolygonMasks(area, polygons):
+    geometry = getAreaGeometry(area)
+    sha = hashlib.sha1(json.dumps(dict((k, v) for k, v in geometry.items() if k != 'proj'), sort_keys=True))
+    for polygon in polygons:
+        sha.update('polygon')
+        if len(polygon) > 0 and np.asarray(polygon[0], dtype=float).ndim == 1:
+            polygon = [polygon]
+        for ring in polygon:
+            sha.update('ring')
+            sha.update(np.ascontiguousarray(ring, dtype=float).tostring())
+    digest = sha.hexdigest()
+
+    masks = POLYGON_MASKS.get(digest)
+    if masks != None:
+        return masks
+    maskPath = NDFD_TMP + NDFD_MASKS + NDFD_MASK.format(area, digest)
+    if path.isfile(maskPath):
+        with np.load(maskPath) as f:
+            masks = (f['cells'], f['ids'])
+    else:
+        masks = rasterizePolygons(area, polygons)
+        if not path.isdir(path.dirname(maskPath)):
+            try: makedirs(path.dirname(maskPath))
+            except OSError: pass
+        _atomicWrite(maskPath, lambda f: np.savez(f, cells=masks[0], ids=masks[1]))
+    POLYGON_MASKS.put(digest, masks)
+    return masks
+
+'''
+
+  Function:	getPolygonSummary
+  Purpose:	Summarize the values of a grid over each polygon's cells, with one
+		weighted bincount per sum over all polygons. Return a dict of arrays
+		with one entry per polygon, like getWindowSummary does for windows.
+  Params:
+	values:		The grid values, see getGridValues
+	masks:		The (cells, ids) polygon masks, see getPolygonMasks
+	count:		The number of polygons
+	stats:		Optional list of statistics the summary is for. Default is all of them.
+
+'''
+def getPolygonSummary(values, masks, count, stats=None):
+    if stats == None:
+        stats = STATISTICS
+    cells, ids = masks
+    vals = values.ravel()[cells]
+    valid = ~np.isnan(vals)
+    ids, vals = ids[valid], vals[valid]
+
+    summary = { }
+    summary['count'] = np.bincount(ids, minlength=count).astype(float)
+    summary['sum'] = np.bincount(ids, vals, minlength=count)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = summary['sum'] / summary['count']
+    summary['m2'] = np.bincount(ids, (vals - means[ids]) ** 2, minlength=count)
+    for stat, fn in [('min', np.fmin), ('max', np.fmax)]:
+        if stat in stats:
+            summary[stat] = np.full(count, np.nan)
+            fn.at(summary[stat], ids, vals)
+    return summary
+
+
+'''
+
+  Function:	getPolygonAnalysis
+  Purpose:	Compute statistics of an NDFD variable over each of a list of polygons,
+		such as counties or forecast zones, for every forecast time. Polygons
+		are rasterized once per grid, see getPolygonMasks, and each message is
+		aggregated for all polygons at once. A cell belongs to a polygon when
+		its center is inside it.
+  Params:
+	var:		The NDFD variable to analyze
+	area:		The NDFD grid area of the polygons
+	polygons:	List of polygons, see rasterizePolygons
+	timeStep:	The time step in hours to use in the analysis. Default = 1
+	minTime:	Optional minimum time to analyze
+	maxTime:	Optional maximum time to analyze
+	stats:		Optional list of statistics to compute, any of STATISTICS except
+			the median. Default is all of them.
+  Notes:
+	- Statistics are returned as arrays with one value per polygon, NaN for
+	  polygons without valid values.
+
+'''
+def getPolygonAnalysis(var, area, polygons, timeStep=1, minTime=None, maxTime=None, stats=None):
+    if stats == None:
+        stats = [stat for stat in STATISTICS if stat != 'median']
+    for stat in stats:
+        if not stat in STATISTICS:
+            raise ValueError('Invalid statistic: ' + str(stat))
+        if stat == 'median':
+            raise ValueError('The median is not available for polygons')
+    validateArguments(var, area, timeStep, minTime, maxTime)
+
+    analysis = { }
+    analysis['var'] = var
+    analysis['area'] = area
+    analysis['forecastTime'] = getLatestForecastTime()
+    analysis['forecasts'] = { }
 
+    masks = getPolygonMasks(area, polygons)
+    analysis['points'] = np.bincount(masks[1], minlength=len(polygons))
+
+    validTimes = getValidTimes(analysis['forecastTime'], timeStep, minTime, maxTime)
+    summaries = []
+    for grb in getForecastMessages(var, area, minTime, maxTime, validTimes):
+        if not 'units' in analysis:
+            analysis['units'] = grb['parameterUnits']
+        summary = getPolygonSummary(getGridValues(grb), masks, len(polygons), stats)
+        analysis['forecasts'][grb.validTime] = getSummaryStatistics(summary, stats)
+        summaries.append(summary)
+
+    if len(summaries) > 0:
+        summary = dict((key, np.array([s[key] for s in summaries])) for key in summaries[0])
+        analysis.update(getSummaryStatistics(reduceWindowSummary(summary, axis=0), stats))
+    else:
+        for stat in stats:
+            analysis[stat] = np.full(len(polygons), np.nan)
     return analysis
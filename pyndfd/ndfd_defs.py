@@ -459,7 +459,307 @@ WWA_VARS = \
 }
 
 GRID_VARS = \
-{'nhemi': {'lonC': -100.5547707337221, 'latC': 40.60568536609355, 'size': 1509825}, 'guam': {'lonC': 145.9833572496674, 'latC': 14.583394122119477, 'size': 37249}, 'puertori': {'lonC': -66.00615355628241, 'latC': 18.25443391528987, 'size': 76275}, 'midatlan': {'lonC': -80.08212268970772, 'latC': 35.50017273099019, 'size': 38800}, 'alaska': {'lonC': -153.0128931396447, 'latC': 60.12781502200543, 'size': 456225}, 'splains': {'lonC': -99.42894335201238, 'latC': 31.776849688255663, 'size': 86350}, 'nplains': {'lonC': -98.32997169916455, 'latC': 45.12557007784838, 'size': 60228}, 'npacocn': {'lonC': -179.56420967686748, 'latC': 24.663412972627867, 'size': 1580529}, 'crrocks': {'lonC': -107.30242999298261, 'latC': 39.8247573600583, 'size': 46990}, 'crgrlake': {'lonC': -83.04687038362809, 'latC': 43.269091951527486, 'size': 37887}, 'crmissvy': {'lonC': -89.85525808934726, 'latC': 38.18659888001805, 'size': 36839}, 'srockies': {'lonC': -108.39840154112714, 'latC': 35.31391549893657, 'size': 50730}, 'conus': {'lonC': -95.4524033407926, 'latC': 38.21829701333828, 'size': 2953665}, 'umissvly': {'lonC': -93.20517762503603, 'latC': 44.1604283677903, 'size': 66150}, 'smissvly': {'lonC': -90.69563009235515, 'latC': 32.73214446882297, 'size': 36616}, 'neast': {'lonC': -72.4333066919216, 'latC': 43.06356470945907, 'size': 42823}, 'seast': {'lonC': -84.47197282984519, 'latC': 28.340905405095224, 'size': 48843}, 'pacswest': {'lonC': -116.095115120485, 'latC': 36.14134643164874, 'size': 78624}, 'crplains': {'lonC': -99.0486831495504, 'latC': 39.10288297842758, 'size': 41701}, 'nrockies': {'lonC': -107.92280242464689, 'latC': 45.19031554443591, 'size': 69768}, 'pacnwest': {'lonC': -118.10980677782631, 'latC': 45.351542779764905, 'size': 66356}, 'hawaii': {'lonC': -157.69694691722103, 'latC': 20.60086183593535, 'size': 72225}, 'ergrlake': {'lonC': -80.62536576992913, 'latC': 43.0970932712032, 'size': 35904}}
+{
+  'alaska':
+  {
+    'lonC': -153.0128931396447,
+    'latC': 60.12781502200543,
+    'size': 456225,
+    'projparams': { 'proj': 'stere', 'a': 6371200.0, 'b': 6371200.0, 'lat_ts': 60.0, 'lat_0': 90.0, 'lon_0': 210.0 },
+    'lat1': 40.530101,
+    'lon1': 181.429,
+    'dx': 5953.125,
+    'dy': 5953.125,
+    'nx': 825,
+    'ny': 553
+  },
+  'conus':
+  {
+    'lonC': -95.4524033407926,
+    'latC': 38.21829701333828,
+    'size': 2953665,
+    'projparams': { 'proj': 'lcc', 'a': 6371200.0, 'b': 6371200.0, 'lat_0': 25.0, 'lat_1': 25.0, 'lat_2': 25.0, 'lon_0': 265.0 },
+    'lat1': 20.191999,
+    'lon1': 238.445999,
+    'dx': 2539.703,
+    'dy': 2539.703,
+    'nx': 2145,
+    'ny': 1377
+  },
+  'crgrlake':
+  {
+    'lonC': -83.04687038362809,
+    'latC': 43.269091951527486,
+    'size': 37887,
+    'projparams': { 'proj': 'lcc', 'a': 6371200.0, 'b': 6371200.0, 'lat_0': 25.0, 'lat_1': 25.0, 'lat_2': 25.0, 'lon_0': 265.0 },
+    'lat1': 38.76136,
+    'lon1': 271.537872,
+    'dx': 5079.406,
+    'dy': 5079.406,
+    'nx': 173,
+    'ny': 219
+  },
+  'crmissvy':
+  {
+    'lonC': -89.85525808934726,
+    'latC': 38.18659888001805,
+    'size': 36839,
+    'projparams': { 'proj': 'lcc', 'a': 6371200.0, 'b': 6371200.0, 'lat_0': 25.0, 'lat_1': 25.0, 'lat_2': 25.0, 'lon_0': 265.0 },
+    'lat1': 34.099109,
+    'lon1': 264.618774,
+    'dx': 5079.406,
+    'dy': 5079.406,
+    'nx': 197,
+    'ny': 187
+  },
+  'crplains':
+  {
+    'lonC': -99.0486831495504,
+    'latC': 39.10288297842758,
+    'size': 41701,
+    'projparams': { 'proj': 'lcc', 'a': 6371200.0, 'b': 6371200.0, 'lat_0': 25.0, 'lat_1': 25.0, 'lat_2': 25.0, 'lon_0': 265.0 },
+    'lat1': 34.698848,
+    'lon1': 255.027648,
+    'dx': 5079.406,
+    'dy': 5079.406,
+    'nx': 223,
+    'ny': 187
+  },
+  'crrocks':
+  {
+    'lonC': -107.30242999298261,
+    'latC': 39.8247573600583,
+    'size': 46990,
+    'projparams': { 'proj': 'lcc', 'a': 6371200.0, 'b': 6371200.0, 'lat_0': 25.0, 'lat_1': 25.0, 'lat_2': 25.0, 'lon_0': 265.0 },
+    'lat1': 35.104579,
+    'lon1': 246.20404,
+    'dx': 5079.406,
+    'dy': 5079.406,
+    'nx': 254,
+    'ny': 185
+  },
+  'ergrlake':
+  {
+    'lonC': -80.62536576992913,
+    'latC': 43.0970932712032,
+    'size': 35904,
+    'projparams': { 'proj': 'lcc', 'a': 6371200.0, 'b': 6371200.0, 'lat_0': 25.0, 'lat_1': 25.0, 'lat_2': 25.0, 'lon_0': 265.0 },
+    'lat1': 39.25241,
+    'lon1': 273.512695,
+    'dx': 5079.406,
+    'dy': 5079.406,
+    'nx': 187,
+    'ny': 192
+  },
+  'guam':
+  {
+    'lonC': 145.9833572496674,
+    'latC': 14.583394122119477,
+    'size': 37249,
+    'projparams': { 'proj': 'merc', 'a': 6371200.0, 'b': 6371200.0, 'lat_ts': 20.0, 'lon_0': 145.983357 },
+    'lat1': 12.349882,
+    'lon1': 143.686538,
+    'dx': 2500.0,
+    'dy': 2500.0,
+    'nx': 193,
+    'ny': 193
+  },
+  'hawaii':
+  {
+    'lonC': -157.69694691722103,
+    'latC': 20.60086183593535,
+    'size': 72225,
+    'projparams': { 'proj': 'merc', 'a': 6371200.0, 'b': 6371200.0, 'lat_ts': 20.0, 'lon_0': 202.303053 },
+    'lat1': 18.072656,
+    'lon1': 198.475021,
+    'dx': 2500.0,
+    'dy': 2500.0,
+    'nx': 321,
+    'ny': 225
+  },
+  'midatlan':
+  {
+    'lonC': -80.08212268970772,
+    'latC': 35.50017273099019,
+    'size': 38800,
+    'projparams': { 'proj': 'lcc', 'a': 6371200.0, 'b': 6371200.0, 'lat_0': 25.0, 'lat_1': 25.0, 'lat_2': 25.0, 'lon_0': 265.0 },
+    'lat1': 31.390289,
+    'lon1': 274.20578,
+    'dx': 5079.406,
+    'dy': 5079.406,
+    'nx': 194,
+    'ny': 200
+  },
+  'neast':
+  {
+    'lonC': -72.4333066919216,
+    'latC': 43.06356470945907,
+    'size': 42823,
+    'projparams': { 'proj': 'lcc', 'a': 6371200.0, 'b': 6371200.0, 'lat_0': 25.0, 'lat_1': 25.0, 'lat_2': 25.0, 'lon_0': 265.0 },
+    'lat1': 38.698341,
+    'lon1': 281.282653,
+    'dx': 5079.406,
+    'dy': 5079.406,
+    'nx': 187,
+    'ny': 229
+  },
+  'nhemi':
+  {
+    'lonC': -100.5547707337221,
+    'latC': 40.60568536609355,
+    'size': 1509825,
+    'projparams': { 'proj': 'lcc', 'a': 6371200.0, 'b': 6371200.0, 'lat_0': 25.0, 'lat_1': 25.0, 'lat_2': 25.0, 'lon_0': 265.0 },
+    'lat1': 12.189999,
+    'lon1': 226.541,
+    'dx': 5079.406,
+    'dy': 5079.406,
+    'nx': 1473,
+    'ny': 1025
+  },
+  'npacocn':
+  {
+    'lonC': -179.56420967686748,
+    'latC': 24.663412972627867,
+    'size': 1580529,
+    'projparams': { 'proj': 'merc', 'a': 6371200.0, 'b': 6371200.0, 'lat_ts': 20.0, 'lon_0': 180.43579 },
+    'lat1': -25.0,
+    'lon1': 110.0,
+    'dx': 10000.0,
+    'dy': 10000.0,
+    'nx': 1473,
+    'ny': 1073
+  },
+  'nplains':
+  {
+    'lonC': -98.32997169916455,
+    'latC': 45.12557007784838,
+    'size': 60228,
+    'projparams': { 'proj': 'lcc', 'a': 6371200.0, 'b': 6371200.0, 'lat_0': 25.0, 'lat_1': 25.0, 'lat_2': 25.0, 'lon_0': 265.0 },
+    'lat1': 39.682701,
+    'lon1': 254.61293,
+    'dx': 5079.406,
+    'dy': 5079.406,
+    'nx': 252,
+    'ny': 239
+  },
+  'nrockies':
+  {
+    'lonC': -107.92280242464689,
+    'latC': 45.19031554443591,
+    'size': 69768,
+    'projparams': { 'proj': 'lcc', 'a': 6371200.0, 'b': 6371200.0, 'lat_0': 25.0, 'lat_1': 25.0, 'lat_2': 25.0, 'lon_0': 265.0 },
+    'lat1': 39.44028,
+    'lon1': 243.98146,
+    'dx': 5079.406,
+    'dy': 5079.406,
+    'nx': 306,
+    'ny': 228
+  },
+  'pacnwest':
+  {
+    'lonC': -118.10980677782631,
+    'latC': 45.351542779764905,
+    'size': 66356,
+    'projparams': { 'proj': 'lcc', 'a': 6371200.0, 'b': 6371200.0, 'lat_0': 25.0, 'lat_1': 25.0, 'lat_2': 25.0, 'lon_0': 265.0 },
+    'lat1': 39.49451,
+    'lon1': 234.116882,
+    'dx': 5079.406,
+    'dy': 5079.406,
+    'nx': 313,
+    'ny': 212
+  },
+  'pacswest':
+  {
+    'lonC': -116.095115120485,
+    'latC': 36.14134643164874,
+    'size': 78624,
+    'projparams': { 'proj': 'lcc', 'a': 6371200.0, 'b': 6371200.0, 'lat_0': 25.0, 'lat_1': 25.0, 'lat_2': 25.0, 'lon_0': 265.0 },
+    'lat1': 29.26025,
+    'lon1': 236.87445,
+    'dx': 5079.406,
+    'dy': 5079.406,
+    'nx': 312,
+    'ny': 252
+  },
+  'puertori':
+  {
+    'lonC': -66.00615355628241,
+    'latC': 18.25443391528987,
+    'size': 76275,
+    'projparams': { 'proj': 'merc', 'a': 6371200.0, 'b': 6371200.0, 'lat_ts': 20.0, 'lon_0': 293.993846 },
+    'lat1': 16.977483,
+    'lon1': 291.972167,
+    'dx': 1250.0,
+    'dy': 1250.0,
+    'nx': 339,
+    'ny': 225
+  },
+  'seast':
+  {
+    'lonC': -84.47197282984519,
+    'latC': 28.340905405095224,
+    'size': 48843,
+    'projparams': { 'proj': 'lcc', 'a': 6371200.0, 'b': 6371200.0, 'lat_0': 25.0, 'lat_1': 25.0, 'lat_2': 25.0, 'lon_0': 265.0 },
+    'lat1': 24.078519,
+    'lon1': 269.102661,
+    'dx': 5079.406,
+    'dy': 5079.406,
+    'nx': 243,
+    'ny': 201
+  },
+  'smissvly':
+  {
+    'lonC': -90.69563009235515,
+    'latC': 32.73214446882297,
+    'size': 36616,
+    'projparams': { 'proj': 'lcc', 'a': 6371200.0, 'b': 6371200.0, 'lat_0': 25.0, 'lat_1': 25.0, 'lat_2': 25.0, 'lon_0': 265.0 },
+    'lat1': 28.606119,
+    'lon1': 264.013305,
+    'dx': 5079.406,
+    'dy': 5079.406,
+    'nx': 199,
+    'ny': 184
+  },
+  'splains':
+  {
+    'lonC': -99.42894335201238,
+    'latC': 31.776849688255663,
+    'size': 86350,
+    'projparams': { 'proj': 'lcc', 'a': 6371200.0, 'b': 6371200.0, 'lat_0': 25.0, 'lat_1': 25.0, 'lat_2': 25.0, 'lon_0': 265.0 },
+    'lat1': 25.106399,
+    'lon1': 252.877075,
+    'dx': 5079.406,
+    'dy': 5079.406,
+    'nx': 314,
+    'ny': 275
+  },
+  'srockies':
+  {
+    'lonC': -108.39840154112714,
+    'latC': 35.31391549893657,
+    'size': 50730,
+    'projparams': { 'proj': 'lcc', 'a': 6371200.0, 'b': 6371200.0, 'lat_0': 25.0, 'lat_1': 25.0, 'lat_2': 25.0, 'lon_0': 265.0 },
+    'lat1': 30.31159,
+    'lon1': 245.120468,
+    'dx': 5079.406,
+    'dy': 5079.406,
+    'nx': 267,
+    'ny': 190
+  },
+  'umissvly':
+  {
+    'lonC': -93.20517762503603,
+    'latC': 44.1604283677903,
+    'size': 66150,
+    'projparams': { 'proj': 'lcc', 'a': 6371200.0, 'b': 6371200.0, 'lat_0': 25.0, 'lat_1': 25.0, 'lat_2': 25.0, 'lon_0': 265.0 },
+    'lat1': 38.184898,
+    'lon1': 259.795623,
+    'dx': 5079.406,
+    'dy': 5079.406,
+    'nx': 245,
+    'ny': 270
+  }
+}
 
 def ndfdDefs():
     return { 'vars': NDFD_VARS, 'wx': WX_VARS, 'wwa': WWA_VARS, 'grids': GRID_VARS }
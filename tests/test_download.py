@@ -0,0 +1,142 @@
+'''
+
+  Tests for the HTTP download path of pyndfd.ndfd against a local stand-in
+  server: keep-alive connection reuse, conditional GETs answered with 304,
+  range requests, If-Range and redirects.
+
+  Run with:	python -m unittest discover tests
+
+'''
+
+import BaseHTTPServer
+import SocketServer
+import hashlib
+import shutil
+import tempfile
+import threading
+import unittest
+from os import makedirs, path
+from urlparse import urlparse
+
+from pyndfd import ndfd
+
+FILES = {
+  '/ds.temp.bin': 'GRIB' + ''.join(chr(i % 256) for i in range(5000)),
+  '/ds.td.bin': 'GRIB' + 'td' * 1000
+}
+
+class StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests.append((self.client_address, self.path, dict(self.headers)))
+        if self.path.startswith('/redirect'):
+            self.sendResponse(302, '', { 'Location': self.path[len('/redirect'):] })
+            return
+        if not self.path in FILES:
+            self.sendResponse(404, '')
+            return
+
+        data = FILES[self.path]
+        etag = '"' + hashlib.sha1(data).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.sendResponse(304, '', { 'ETag': etag })
+            return
+        byteRange = self.headers.get('Range')
+        ifRange = self.headers.get('If-Range')
+        if byteRange != None and (ifRange == None or ifRange == etag):
+            start, end = [int(b) for b in byteRange.split('=')[1].split('-')]
+            end = min(end, len(data) - 1)
+            self.sendResponse(206, data[start:end + 1], { 'Content-Range': 'bytes {0}-{1}/{2}'.format(start, end, len(data)), 'ETag': etag })
+            return
+        self.sendResponse(200, data, { 'ETag': etag })
+
+    def sendResponse(self, status, body, headers={ }):
+        self.server.statuses.append(status)
+        self.send_response(status)
+        for key in headers:
+            self.send_header(key, headers[key])
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class StandInServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+class DownloadTest(unittest.TestCase):
+    def setUp(self):
+        self.server = StandInServer(('127.0.0.1', 0), StandInHandler)
+        self.server.requests = []
+        self.server.statuses = []
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.base = 'http://127.0.0.1:{0}'.format(self.server.server_address[1])
+
+        self.tmp = tempfile.mkdtemp()
+        self.oldTmp = ndfd.NDFD_TMP
+        ndfd.NDFD_TMP = self.tmp + path.sep
+        makedirs(self.tmp + path.sep + 'files')
+        ndfd.HTTP_CONNECTIONS.pool = { }
+
+    def tearDown(self):
+        for conn in ndfd.HTTP_CONNECTIONS.pool.values():
+            conn.close()
+        ndfd.HTTP_CONNECTIONS.pool = { }
+        self.server.shutdown()
+        self.server.server_close()
+        ndfd.NDFD_TMP = self.oldTmp
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def localPath(self, name):
+        return self.tmp + path.sep + 'files' + path.sep + name
+
+    def read(self, localPath):
+        with open(localPath, 'rb') as f:
+            return f.read()
+
+    def testKeepAlive(self):
+        ndfd.downloadFile(self.base + '/ds.temp.bin', self.localPath('temp'))
+        ndfd.downloadFile(self.base + '/ds.td.bin', self.localPath('td'))
+        self.assertEqual(self.read(self.localPath('temp')), FILES['/ds.temp.bin'])
+        self.assertEqual(self.read(self.localPath('td')), FILES['/ds.td.bin'])
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(len(set(r[0] for r in self.server.requests)), 1)
+
+    def testNotModified(self):
+        uri = self.base + '/ds.temp.bin'
+        ndfd.downloadFile(uri, self.localPath('temp'))
+        ndfd.downloadFile(uri, self.localPath('temp2'))
+        self.assertEqual(self.server.requests[1][2].get('if-none-match'), '"' + hashlib.sha1(FILES['/ds.temp.bin']).hexdigest() + '"')
+        self.assertEqual(self.server.statuses, [200, 304])
+        self.assertEqual(self.read(self.localPath('temp2')), FILES['/ds.temp.bin'])
+
+    def testRange(self):
+        data, size, validator = ndfd._requestRange(urlparse(self.base + '/ds.temp.bin'), 100, 199)
+        self.assertEqual(data, FILES['/ds.temp.bin'][100:200])
+        self.assertEqual(size, len(FILES['/ds.temp.bin']))
+        self.assertEqual(validator, '"' + hashlib.sha1(FILES['/ds.temp.bin']).hexdigest() + '"')
+        self.assertEqual(self.server.requests[0][2].get('range'), 'bytes=100-199')
+
+    def testRangeChanged(self):
+        url = urlparse(self.base + '/ds.temp.bin')
+        validator = ndfd._requestRange(url, 0, 99)[2]
+        self.assertNotEqual(ndfd._requestRange(url, 100, 199, validator), None)
+        self.assertEqual(ndfd._requestRange(url, 100, 199, '"stale"'), None)
+        self.assertEqual(self.server.requests[2][2].get('if-range'), '"stale"')
+        self.assertEqual(self.server.statuses, [206, 206, 200])
+
+    def testRedirect(self):
+        ndfd.downloadFile(self.base + '/redirect/ds.td.bin', self.localPath('td'))
+        self.assertEqual(self.read(self.localPath('td')), FILES['/ds.td.bin'])
+        self.assertEqual([r[1] for r in self.server.requests], ['/redirect/ds.td.bin', '/ds.td.bin'])
+        self.assertEqual(self.server.statuses, [302, 200])
+
+    def testMissing(self):
+        self.assertRaises(RuntimeError, ndfd.downloadFile, self.base + '/ds.wx.bin', self.localPath('wx'))
+
+if __name__ == '__main__':
+    unittest.main()
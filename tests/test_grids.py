@@ -0,0 +1,66 @@
+'''
+
+  Tests for NDFD area selection in pyndfd.ndfd: footprints come from the static
+  grid definitions in ndfd_defs without any downloads.
+
+  Run with:	python -m unittest discover tests
+
+'''
+
+import unittest
+
+import numpy as np
+
+from pyndfd import ndfd
+
+CITIES = [
+  ('Boston', 42.36, -71.06, 'neast'),
+  ('Miami', 25.76, -80.19, 'seast'),
+  ('Seattle', 47.6, -122.33, 'pacnwest'),
+  ('Dallas', 32.78, -96.8, 'splains'),
+  ('Anchorage', 61.2, -149.9, 'alaska'),
+  ('Honolulu', 21.3, -157.85, 'hawaii'),
+  ('San Juan', 18.45, -66.1, 'puertori'),
+  ('Hagatna', 13.45, 144.78, 'guam'),
+  ('Central Pacific', 30.0, -170.0, 'npacocn')
+]
+
+class GridTest(unittest.TestCase):
+    def setUp(self):
+        self.oldTmp = ndfd.NDFD_TMP
+        self.oldServer = ndfd.NDFD_LOCAL_SERVER
+        # any download would fail
+        ndfd.NDFD_TMP = '/nonexistent/'
+        ndfd.setLocalCacheServer('http://127.0.0.1:1/')
+
+    def tearDown(self):
+        ndfd.NDFD_TMP = self.oldTmp
+        ndfd.NDFD_LOCAL_SERVER = self.oldServer
+
+    def testSmallestGrid(self):
+        for name, lat, lon, area in CITIES:
+            self.assertEqual(ndfd.getSmallestGrid(lat, lon), area, name)
+
+    def testSmallestGridArray(self):
+        lats = np.array([city[1] for city in CITIES] + [51.5])
+        lons = np.array([city[2] for city in CITIES] + [-0.1])
+        areas = ndfd.getSmallestGrid(lats, lons)
+        self.assertEqual(list(areas), [city[3] for city in CITIES] + [None])
+
+    def testSmallestCommonGrid(self):
+        self.assertEqual(ndfd.getSmallestCommonGrid(np.array([42.36, 40.71]), np.array([-71.06, -74.01])), 'neast')
+        self.assertEqual(ndfd.getSmallestCommonGrid(np.array([42.36, 47.6]), np.array([-71.06, -122.33])), 'conus')
+        self.assertRaises(ValueError, ndfd.getSmallestCommonGrid, np.array([42.36, 21.3]), np.array([-71.06, -157.85]))
+
+    def testCenter(self):
+        for area in ndfd.DEFS['grids']:
+            grid = ndfd.DEFS['grids'][area]
+            geometry = ndfd.getAreaGeometry(area)
+            ny, nx = geometry['shape']
+            self.assertEqual(nx * ny, grid['size'])
+            lon, lat = geometry['proj'](geometry['offsetX'] + geometry['dx'] * (nx // 2), geometry['offsetY'] + geometry['dy'] * (ny // 2), inverse=True)
+            self.assertAlmostEqual(lat, grid['latC'], 5)
+            self.assertAlmostEqual((lon - grid['lonC'] + 180) % 360 - 180, 0, 5)
+
+if __name__ == '__main__':
+    unittest.main()
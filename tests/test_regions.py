@@ -0,0 +1,136 @@
+'''
+
+  Tests for the array based region labelling and polygon rasterization in
+  pyndfd.ndfd against straightforward reference implementations: a breadth
+  first search over the eight neighbors of each cell and an even-odd point in
+  polygon test of each cell center.
+
+  Run with:	python -m unittest discover tests
+
+'''
+
+import unittest
+from collections import deque
+
+import numpy as np
+
+from pyndfd import ndfd
+
+def labelRegions(mask):
+    # breadth first search, numbering regions in order of their first cell
+    ny, nx = mask.shape
+    labels = np.full(mask.shape, -1, dtype=int)
+    count = 0
+    for start in zip(*np.nonzero(mask)):
+        if labels[start] >= 0:
+            continue
+        labels[start] = count
+        queue = deque([start])
+        while queue:
+            y, x = queue.popleft()
+            for dy in (-1, 0, 1):
+                for dx in (-1, 0, 1):
+                    v, u = y + dy, x + dx
+                    if 0 <= v < ny and 0 <= u < nx and mask[v, u] and labels[v, u] < 0:
+                        labels[v, u] = count
+                        queue.append((v, u))
+        count += 1
+    return labels
+
+def insidePolygon(x, y, rings):
+    # even-odd rule, counting edges whose crossing of the row is left of the point
+    inside = np.zeros(x.shape, dtype=bool)
+    for ringX, ringY in rings:
+        for x0, y0, x1, y1 in zip(np.roll(ringX, 1), np.roll(ringY, 1), ringX, ringY):
+            crosses = (y0 <= y) != (y1 <= y)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                crossing = x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+            inside ^= crosses & (crossing <= x)
+    return inside
+
+class RegionLabelTest(unittest.TestCase):
+    def check(self, mask):
+        cells = np.flatnonzero(mask)
+        labels = ndfd.getRegionLabels(cells, mask.shape)
+        expected = labelRegions(mask).ravel()[cells]
+        self.assertEqual(len(labels), len(cells))
+        self.assertTrue(np.array_equal(labels, expected))
+
+    def testRandom(self):
+        rng = np.random.RandomState(0)
+        for n in range(100):
+            shape = tuple(rng.randint(1, 40, 2))
+            self.check(rng.rand(*shape) < rng.rand())
+
+    def testShapes(self):
+        mask = np.zeros((9, 9), dtype=bool)
+        # a ring around a separate center cell
+        mask[1, 1:6] = mask[5, 1:6] = mask[1:6, 1] = mask[1:6, 5] = True
+        mask[3, 3] = True
+        # a diagonal line and a short arm that meets it
+        mask[np.arange(9), np.arange(9)[::-1]] = True
+        mask[7:, 6] = True
+        self.check(mask)
+        self.check(np.ones((5, 7), dtype=bool))
+        self.check(np.eye(6, dtype=bool))
+
+    def testEmpty(self):
+        self.assertEqual(len(ndfd.getRegionLabels(np.empty(0, dtype=int), (3, 3))), 0)
+
+class RasterizeTest(unittest.TestCase):
+    area = 'guam'
+
+    def setUp(self):
+        self.geometry = ndfd.getAreaGeometry(self.area)
+        ny, nx = self.geometry['shape']
+        self.y, self.x = np.mgrid[0:ny, 0:nx]
+        self.y, self.x = self.y.ravel().astype(float), self.x.ravel().astype(float)
+
+    def toGrid(self, ring):
+        ring = np.asarray(ring, dtype=float)
+        gridX, gridY = self.geometry['proj'](ring[:, 1], ring[:, 0])
+        return (gridX - self.geometry['offsetX']) / self.geometry['dx'], (gridY - self.geometry['offsetY']) / self.geometry['dy']
+
+    def toLatLon(self, x, y):
+        lons, lats = self.geometry['proj'](self.geometry['offsetX'] + x * self.geometry['dx'], self.geometry['offsetY'] + y * self.geometry['dy'], inverse=True)
+        return np.column_stack([lats, lons])
+
+    def testRandom(self):
+        ny, nx = self.geometry['shape']
+        rng = np.random.RandomState(0)
+        polygons = []
+        for n in range(20):
+            # some polygons self-intersect and some reach beyond the grid
+            rings = []
+            for r in range(rng.randint(1, 3)):
+                count = rng.randint(3, 12)
+                cx, cy = rng.uniform(-20, nx + 20), rng.uniform(-20, ny + 20)
+                rings.append(self.toLatLon(cx + rng.uniform(-40, 40, count), cy + rng.uniform(-40, 40, count)))
+            polygons.append(rings)
+
+        cells, ids = ndfd.rasterizePolygons(self.area, polygons)
+        for i, polygon in enumerate(polygons):
+            inside = insidePolygon(self.x, self.y, [self.toGrid(ring) for ring in polygon])
+            if not inside.any():
+                continue
+            self.assertTrue(np.array_equal(np.sort(cells[ids == i]), np.flatnonzero(inside)), 'Polygon ' + str(i))
+
+    def testHole(self):
+        outer = self.toLatLon(np.array([10.3, 60.3, 60.3, 10.3]), np.array([10.3, 10.3, 60.3, 60.3]))
+        hole = self.toLatLon(np.array([20.7, 40.7, 40.7, 20.7]), np.array([20.7, 20.7, 40.7, 40.7]))
+        cells, ids = ndfd.rasterizePolygons(self.area, [[outer, hole]])
+        self.assertEqual(len(cells), 50 * 50 - 20 * 20)
+        self.assertFalse((30 * self.geometry['shape'][1] + 30) in cells)
+
+    def testSmallPolygon(self):
+        tiny = self.toLatLon(np.array([5.1, 5.2, 5.15]), np.array([7.1, 7.1, 7.2]))
+        cells, ids = ndfd.rasterizePolygons(self.area, [tiny])
+        self.assertEqual(list(cells), [7 * self.geometry['shape'][1] + 5])
+        self.assertEqual(list(ids), [0])
+
+    def testInvalid(self):
+        self.assertRaises(ValueError, ndfd.rasterizePolygons, self.area, [[]])
+        self.assertRaises(ValueError, ndfd.rasterizePolygons, self.area, [[[(1.0, 2.0, 3.0)]]])
+
+if __name__ == '__main__':
+    unittest.main()
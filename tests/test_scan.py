@@ -0,0 +1,43 @@
+'''
+
+  Tests for the threshold expressions of pyndfd.ndfd.scanGrid: parsing and the
+  selection of the grid cells that meet them, where missing values never match.
+
+  Run with:	python -m unittest discover tests
+
+'''
+
+import unittest
+
+import numpy as np
+
+from pyndfd import ndfd
+
+class ThresholdTest(unittest.TestCase):
+    def setUp(self):
+        self.values = np.array([[0.0, 1.0, np.nan], [2.5, np.nan, -1.0]], dtype=np.float32)
+
+    def cells(self, expression):
+        return list(ndfd.getThresholdCells(self.values, ndfd.parseThreshold(expression)))
+
+    def testParse(self):
+        self.assertEqual(ndfd.parseThreshold('> 20'), [('>', 20.0)])
+        self.assertEqual(ndfd.parseThreshold('>= 0.25 & < 1'), [('>=', 0.25), ('<', 1.0)])
+        self.assertEqual(ndfd.parseThreshold('!=-1e3'), [('!=', -1000.0)])
+        self.assertRaises(ValueError, ndfd.parseThreshold, '=> 2')
+        self.assertRaises(ValueError, ndfd.parseThreshold, '> 2 &')
+
+    def testNotEqual(self):
+        self.assertEqual(self.cells('!= 0'), [1, 3, 5])
+
+    def testMissing(self):
+        self.assertEqual(self.cells('> -10'), [0, 1, 3, 5])
+        self.assertEqual(self.cells('< 10 & != 1'), [0, 3, 5])
+        self.assertEqual(self.cells('== 2.5'), [3])
+
+    def testAllMissing(self):
+        self.values = np.full((2, 2), np.nan)
+        self.assertEqual(self.cells('!= 0'), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+'''
+
+  Tests for the vectorized unpacking of the wx and wwa code strings in
+  pyndfd.ndfd against the original loop, which peels 7 bits at a time off one
+  big integer.
+
+  Run with:	python -m unittest discover tests
+
+'''
+
+import unittest
+
+import numpy as np
+
+from pyndfd import ndfd
+
+WX_STRINGS = [
+  '<NoCov>:<NoWx>:<NoInten>:<NoVis>:',
+  'Chc:R:-:<NoVis>:',
+  'Sct:T:<NoInten>:<NoVis>:^Chc:R:-:<NoVis>:',
+  'Wide:S:+:1SM:',
+  'Lkly:RW:m:<NoVis>:^Iso:T:<NoInten>:<NoVis>:'
+]
+WWA_STRINGS = ['<None>', 'WS.A', 'HW.W^FW.A', 'SC.Y', 'FA.A^FF.W^FL.W']
+
+def unpackStringLoop(raw):
+    num_bytes, remainder = divmod(len(raw) * 8 - 1, 7)
+
+    i = int(raw.encode('hex'), 16)
+    if remainder:
+        i >>= remainder
+
+    msg = []
+    for _ in range(num_bytes):
+        byte = i & 127
+        if not byte:
+            msg.append(ord("\n"))
+        elif 32 <= byte <= 126:
+            msg.append(byte)
+        i >>= 7
+    msg.reverse()
+    msg = b"".join(chr(c) for c in msg)
+
+    codes = []
+    for line in msg.splitlines():
+        if len(line) >= 4 and (line.count(':') >= 4 or line.count('.') >= 1 or '<None>' in line):
+            codes.append(line)
+
+    return codes
+
+def packStrings(strings):
+    # 7 bits per character after one unused leading bit, padded to whole bytes
+    msg = '\0'.join(strings) + '\0'
+    size = (len(msg) * 7 + 1 + 7) // 8
+    i = 0
+    for c in msg:
+        i = (i << 7) | ord(c)
+    i <<= (size * 8 - 1) % 7
+    return ('{0:0' + str(size * 2) + 'x}').format(i).decode('hex')
+
+class UnpackTest(unittest.TestCase):
+    def testPacked(self):
+        for strings in [WX_STRINGS, WWA_STRINGS, WX_STRINGS[:1], WWA_STRINGS[:1]]:
+            raw = packStrings(strings)
+            self.assertEqual(ndfd.unpackString(raw), strings)
+            self.assertEqual(ndfd.unpackString(raw), unpackStringLoop(raw))
+
+    def testRandom(self):
+        rng = np.random.RandomState(0)
+        for size in list(range(1, 40)) + list(rng.randint(40, 2000, 20)):
+            raw = rng.randint(0, 256, size).astype(np.uint8).tostring()
+            self.assertEqual(ndfd.unpackString(raw), unpackStringLoop(raw))
+
+    def testRandomStrings(self):
+        rng = np.random.RandomState(1)
+        for n in range(50):
+            strings = [''.join(chr(c) for c in rng.randint(32, 127, rng.randint(1, 30))) for i in range(rng.randint(1, 10))]
+            raw = packStrings(strings)
+            self.assertEqual(ndfd.unpackString(raw), unpackStringLoop(raw))
+
+    def testMemoryView(self):
+        raw = packStrings(WX_STRINGS)
+        self.assertEqual(ndfd.unpackString(memoryview(raw)), WX_STRINGS)
+
+    def testEmpty(self):
+        self.assertEqual(ndfd.unpackString(''), [])
+
+if __name__ == '__main__':
+    unittest.main()